@@ -0,0 +1,54 @@
+""" Compares adding tracks to a MemoryRepository one by one (add_track) against adding them in bulk (add_tracks).
+
+Run from the project root:
+    python -m benchmarks.bench_add_tracks [max_one_by_one_tracks]
+
+Tracks are added in random id order. One by one, every insert shifts the sorted list, so the time grows
+quadratically; it is only measured up to max_one_by_one_tracks (100000 by default).
+"""
+import random
+import sys
+import time
+
+from music.adapters.memory_repository import MemoryRepository
+from music.domainmodel.track import Track
+
+TRACK_COUNTS = (10_000, 100_000, 1_000_000)
+
+
+def create_tracks(number_of_tracks: int) -> list:
+    track_ids = list(range(1, number_of_tracks + 1))
+    random.Random(number_of_tracks).shuffle(track_ids)
+    return [Track(track_id, f'Track {track_id}') for track_id in track_ids]
+
+
+def add_one_by_one(tracks: list) -> float:
+    repo = MemoryRepository()
+    start = time.perf_counter()
+    for track in tracks:
+        repo.add_track(track)
+    return time.perf_counter() - start
+
+
+def add_in_bulk(tracks: list) -> float:
+    repo = MemoryRepository()
+    start = time.perf_counter()
+    repo.add_tracks(tracks)
+    return time.perf_counter() - start
+
+
+def main():
+    max_one_by_one = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    print(f"{'tracks':>10} {'add_track':>12} {'add_tracks':>12} {'speed-up':>9}")
+    for number_of_tracks in TRACK_COUNTS:
+        tracks = create_tracks(number_of_tracks)
+        bulk = add_in_bulk(tracks)
+        if number_of_tracks <= max_one_by_one:
+            one_by_one = add_one_by_one(tracks)
+            print(f'{number_of_tracks:>10} {one_by_one:>11.3f}s {bulk:>11.3f}s {one_by_one / bulk:>8.1f}x')
+        else:
+            print(f"{number_of_tracks:>10} {'skipped':>12} {bulk:>11.3f}s {'':>9}")
+
+
+if __name__ == '__main__':
+    main()
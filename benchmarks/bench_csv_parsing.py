@@ -0,0 +1,46 @@
+""" Compares parsing the tracks csv file with csv.DictReader against the column-projected reader.
+
+Run from the project root:
+    python -m benchmarks.bench_csv_parsing [tracks_csv_file]
+"""
+import csv
+import sys
+import time
+
+from music.adapters.csvdatareader import ParseStats, TRACK_COLUMNS, iter_projected_rows
+from utils import get_project_root
+
+DEFAULT_TRACKS_FILE = get_project_root() / 'music' / 'adapters' / 'data' / 'raw_tracks_excerpt.csv'
+
+
+def parse_with_dict_reader(tracks_file) -> ParseStats:
+    stats = ParseStats()
+    start = time.perf_counter()
+    rows = 0
+    with open(tracks_file, encoding='unicode_escape') as track_csv:
+        for _ in csv.DictReader(track_csv):
+            rows += 1
+    stats.add(rows, time.perf_counter() - start)
+    return stats
+
+
+def parse_projected(tracks_file) -> ParseStats:
+    stats = ParseStats()
+    start = time.perf_counter()
+    rows = sum(1 for _ in iter_projected_rows(str(tracks_file), TRACK_COLUMNS))
+    stats.add(rows, time.perf_counter() - start)
+    return stats
+
+
+def main():
+    tracks_file = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_TRACKS_FILE
+    dict_reader = min((parse_with_dict_reader(tracks_file) for _ in range(5)), key=lambda stats: stats.seconds)
+    projected = min((parse_projected(tracks_file) for _ in range(5)), key=lambda stats: stats.seconds)
+
+    print(f'csv.DictReader (all columns): {dict_reader.rows_per_second:>10.0f} rows/sec')
+    print(f'projected ({len(TRACK_COLUMNS)} columns):     {projected.rows_per_second:>10.0f} rows/sec')
+    print(f'speed-up: {projected.rows_per_second / dict_reader.rows_per_second:.2f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+""" Times MemoryRepository.get_user against the linear scan it replaced, for growing numbers of users.
+
+Run from the project root:
+    python -m benchmarks.bench_get_user [max_scanned_users]
+
+The scan takes time proportional to the number of users, so it is only measured up to max_scanned_users (100000 by
+default).
+"""
+import random
+import sys
+import time
+
+from music.adapters.memory_repository import MemoryRepository
+from music.domainmodel.user import User
+
+USER_COUNTS = (1_000, 10_000, 100_000, 1_000_000)
+LOOKUPS = 10_000
+SCANNED_LOOKUPS = 100
+
+
+def create_repository(number_of_users: int):
+    repo = MemoryRepository()
+    users = [User(user_id, f'user{user_id}', 'Password1') for user_id in range(1, number_of_users + 1)]
+    for user in users:
+        repo.add_user(user)
+    return repo, users
+
+
+def time_lookups(lookup, user_names: list) -> float:
+    """ Returns the best of 5 mean times of looking up every name, in microseconds. """
+    best = None
+    for _ in range(5):
+        start = time.perf_counter()
+        for user_name in user_names:
+            lookup(user_name)
+        seconds = (time.perf_counter() - start) / len(user_names)
+        best = seconds if best is None else min(best, seconds)
+    return best * 1e6
+
+
+def main():
+    max_scanned = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    print(f"{'users':>10} {'get_user':>12} {'scan':>12}")
+    for number_of_users in USER_COUNTS:
+        repo, users = create_repository(number_of_users)
+        rng = random.Random(number_of_users)
+        user_names = [f'user{rng.randint(1, number_of_users)}' for _ in range(LOOKUPS)]
+        indexed = time_lookups(repo.get_user, user_names)
+        if number_of_users <= max_scanned:
+            scan = time_lookups(lambda name: next((user for user in users if user.user_name == name), None),
+                                user_names[:SCANNED_LOOKUPS])
+            print(f'{number_of_users:>10} {indexed:>10.2f}us {scan:>10.0f}us')
+        else:
+            print(f"{number_of_users:>10} {indexed:>10.2f}us {'skipped':>12}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,45 @@
+""" Times reading the tracks csv files with 1, 2 and 4 parse workers.
+
+Run from the project root:
+    python -m benchmarks.bench_parallel_parsing [data_path]
+
+The elapsed time is measured around the whole read, so it shows the real scaling, including starting the process
+pool. On a machine with fewer cores than workers the extra workers only add overhead.
+"""
+import os
+import sys
+import time
+
+from music.adapters.csvdatareader import TrackCSVReader, find_catalog_files
+from utils import get_project_root
+
+DEFAULT_DATA_PATH = get_project_root() / 'music' / 'adapters' / 'data'
+WORKER_COUNTS = (1, 2, 4)
+# Smaller than the reader's default, so the excerpt is split into enough chunks to keep 4 workers busy.
+CHUNK_SIZE = 256 * 1024
+
+
+def read_track_rows(albums_csv_files: list, tracks_csv_files: list, workers: int) -> tuple:
+    """ Returns the rows read, the elapsed seconds and the rows/sec the reader reported. """
+    reader = TrackCSVReader(albums_csv_files, tracks_csv_files, False)
+    start = time.perf_counter()
+    rows = sum(1 for _ in reader.iter_track_rows(workers, CHUNK_SIZE))
+    return rows, time.perf_counter() - start, reader.track_parse_stats.rows_per_second
+
+
+def main():
+    data_path = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_DATA_PATH
+    albums_csv_files, tracks_csv_files = find_catalog_files(data_path)
+    print(f'{os.cpu_count()} cpu(s), {len(tracks_csv_files)} tracks csv file(s)')
+
+    baseline = None
+    for workers in WORKER_COUNTS:
+        runs = [read_track_rows(albums_csv_files, tracks_csv_files, workers) for _ in range(3)]
+        rows, seconds, reported = min(runs, key=lambda result: result[1])
+        baseline = baseline or seconds
+        print(f'{workers} worker(s): {rows} rows in {seconds:6.2f}s, {rows / seconds:>10.0f} rows/sec '
+              f'(reported {reported:>10.0f}), speed-up {baseline / seconds:.2f}x')
+
+
+if __name__ == '__main__':
+    main()
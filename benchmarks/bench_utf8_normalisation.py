@@ -0,0 +1,42 @@
+""" Compares reading the tracks csv file with the unicode_escape codec against reading its UTF-8 normalised copy.
+
+Run from the project root, preferably against the full dataset:
+    python -m benchmarks.bench_utf8_normalisation [tracks_csv_file]
+"""
+import sys
+import tempfile
+import time
+
+from music.adapters.csvdatareader import ParseStats, TRACK_COLUMNS, iter_projected_rows
+from music.adapters.catalog_snapshot import normalise_csv_file
+from utils import get_project_root
+
+DEFAULT_TRACKS_FILE = get_project_root() / 'music' / 'adapters' / 'data' / 'raw_tracks_excerpt.csv'
+
+
+def parse(tracks_file, encoding: str) -> ParseStats:
+    stats = ParseStats()
+    start = time.perf_counter()
+    rows = sum(1 for _ in iter_projected_rows(str(tracks_file), TRACK_COLUMNS, encoding=encoding))
+    stats.add(rows, time.perf_counter() - start)
+    return stats
+
+
+def main():
+    tracks_file = str(sys.argv[1] if len(sys.argv) > 1 else DEFAULT_TRACKS_FILE)
+    with tempfile.TemporaryDirectory() as cache_dir:
+        start = time.perf_counter()
+        normalised_file = normalise_csv_file(tracks_file, cache_dir)
+        conversion_seconds = time.perf_counter() - start
+
+        escaped = min((parse(tracks_file, 'unicode_escape') for _ in range(5)), key=lambda stats: stats.seconds)
+        normalised = min((parse(normalised_file, 'utf-8') for _ in range(5)), key=lambda stats: stats.seconds)
+
+    print(f'one-time conversion to UTF-8:  {conversion_seconds:>10.3f} sec')
+    print(f'unicode_escape source file:    {escaped.rows_per_second:>10.0f} rows/sec')
+    print(f'UTF-8 normalised copy:         {normalised.rows_per_second:>10.0f} rows/sec')
+    print(f'speed-up: {normalised.rows_per_second / escaped.rows_per_second:.2f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -2,10 +2,17 @@
 from os import environ
 from dotenv import load_dotenv
 
+from utils import get_project_root
+
 # Load environment variables from file .env, stored in this directory.
 load_dotenv()
 
 
+def project_path(path):
+    """ Resolves a relative path from .env against the project root instead of the working directory. """
+    return str(get_project_root() / path) if path else None
+
+
 class Config:
     """Set Flask configuration from .env file."""
 
@@ -19,9 +26,39 @@ class Config:
 
     REPOSITORY = environ.get('REPOSITORY')
 
+    # Number of processes used to parse the tracks csv file when populating the repository
+    CATALOG_WORKERS = int(environ.get('CATALOG_WORKERS', 1))
+
+    # Folder for UTF-8 copies of the csv files and the parsed catalog snapshot, so later starts skip the slow
+    # unicode_escape decoding and, in memory mode, the csv files altogether. Empty to disable.
+    CATALOG_CACHE_DIR = project_path(environ.get('CATALOG_CACHE_DIR'))
+
+    # Number of tracks whose extended details (listens, favorites, ...) are kept in memory by the track page
+    CATALOG_DETAILS_CACHE_SIZE = int(environ.get('CATALOG_DETAILS_CACHE_SIZE', 1024))
+
+    # Prebuilt catalog database (flask build-catalog), copied instead of populating an empty database. Empty to
+    # always populate from the csv files.
+    CATALOG_ARTIFACT = project_path(environ.get('CATALOG_ARTIFACT'))
+
+    # Bring an existing database up to date with changed csv files on start, instead of leaving it as it is.
+    CATALOG_REFRESH = (environ.get('CATALOG_REFRESH') or 'False').lower().strip() == 'true'
+
+    # Load the catalog on a background thread, so the app starts at once; catalog routes answer 503 until it is loaded
+    # and /readyz reports when it is.
+    CATALOG_BACKGROUND_LOAD = (environ.get('CATALOG_BACKGROUND_LOAD') or 'False').lower().strip() == 'true'
+
     # Database configuration
     SQLALCHEMY_DATABASE_URI = environ.get('SQLALCHEMY_DATABASE_URI')
 
+    # Apply WAL journaling, synchronous=NORMAL, memory-mapped I/O, a larger page cache and in-memory temporary tables to
+    # every SQLite connection. SQLITE_MMAP_SIZE is in bytes, SQLITE_CACHE_SIZE as for PRAGMA cache_size.
+    SQLITE_PERFORMANCE_PROFILE = (environ.get('SQLITE_PERFORMANCE_PROFILE') or 'False').lower().strip() == 'true'
+    SQLITE_MMAP_SIZE = int(environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))
+    SQLITE_CACHE_SIZE = int(environ.get('SQLITE_CACHE_SIZE', -64 * 1024))
+
+    # Number of database connections kept open and shared by requests. 0 opens a new connection per session.
+    DATABASE_POOL_SIZE = int(environ.get('DATABASE_POOL_SIZE', 0))
+
     echo_string = environ.get('SQLALCHEMY_ECHO')
     SQLALCHEMY_ECHO = False
     if echo_string.lower().strip() == "true":
@@ -1,11 +1,10 @@
 """Initialize Flask app."""
 from pathlib import Path
+import click
 from flask import Flask, render_template
 
 # imports from SQLAlchemy
-from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker, clear_mappers
-from sqlalchemy.pool import NullPool
 from music.adapters import database_repository
 
 #Import adapter repositories
@@ -13,6 +12,14 @@ import music.adapters.repository as repo
 from music.adapters.memory_repository import MemoryRepository, populate
 from music.adapters.database_repository import SqlAlchemyRepository,populate_two
 from music.adapters.orm import metadata, map_model_to_tables
+from music.adapters.catalog_delta import refresh_catalog
+from music.adapters.catalog_artifact import build_catalog_artifact, install_catalog_artifact
+from music.adapters.catalog_snapshot import catalog_reader
+from music.adapters.database_engine import create_database_engine
+from music.adapters.migrations import migrate_database, explain_hot_queries, get_schema_version, SCHEMA_VERSION
+from music.adapters.csvdatareader import find_catalog_files
+from music.adapters import track_details
+from music.adapters import catalog_warmup
 
 def page_not_found(e):
     return render_template('404.html'), 404
@@ -22,7 +29,7 @@ def create_app(test_config=None):
 
     # Configure the app from configuration-file settings.
     app.config.from_object('config.Config')
-    data_path = Path('music') / 'adapters' / 'data'
+    data_path = Path(__file__).parent / 'adapters' / 'data'
 
     if test_config is not None:
         # Load test configuration, and override any configuration settings.
@@ -32,13 +39,25 @@ def create_app(test_config=None):
     # Here the "magic" of our repository pattern happens. We can easily switch between in memory data and
     # persistent database data storage for our application.
 
+    # Loads the catalog into the repository, either before the app starts or on a background thread.
+    catalog_loader = None
+    # Migrations applied to the existing database when the app started, and the query plans before them, reported
+    # by flask migrate-database since the migrations already ran by the time the command does.
+    startup_migration = {'applied': [], 'plans_before': None}
+
     if app.config['REPOSITORY'] == 'memory':
         # Create the MemoryRepository implementation for a memory-based repository.
         repo.repo_instance = MemoryRepository()
         # fill the content of the repository from the provided csv files (has to be done every time we start app!)
         database_mode = False
-        # fill the content of the repository from the provided csv files
-        populate(data_path, repo.repo_instance, database_mode)
+        memory_repo = repo.repo_instance
+
+        def populate_memory_catalog():
+            # fill the content of the repository from the provided csv files
+            populate(data_path, memory_repo, database_mode, app.config['CATALOG_WORKERS'],
+                     app.config['CATALOG_CACHE_DIR'])
+
+        catalog_loader = populate_memory_catalog
     
     elif app.config['REPOSITORY'] == 'database':
         # Configure database.
@@ -49,36 +68,148 @@ def create_app(test_config=None):
         # leading to a URI of "sqlite:///covid-19.db".
         # Note that create_engine does not establish any actual DB connection directly!
         database_echo = app.config['SQLALCHEMY_ECHO']
-        # Please do not change the settings for connect_args and poolclass!
-        database_engine = create_engine(database_uri, connect_args={"check_same_thread": False}, poolclass=NullPool,
-                                        echo=database_echo)
+        # Without SQLITE_PERFORMANCE_PROFILE and DATABASE_POOL_SIZE, every session opens a new connection with
+        # SQLite's default settings (NullPool), like before.
+        database_engine = create_database_engine(database_uri, database_echo, app.config['SQLITE_PERFORMANCE_PROFILE'],
+                                                 app.config['SQLITE_MMAP_SIZE'], app.config['SQLITE_CACHE_SIZE'],
+                                                 app.config['DATABASE_POOL_SIZE'])
 
         # Create the database session factory using sessionmaker (this has to be done once, in a global manner)
         session_factory = sessionmaker(autocommit=False, autoflush=True, bind=database_engine)
         # Create the SQLAlchemy DatabaseRepository instance for an sqlite3-based repository.
         repo.repo_instance = SqlAlchemyRepository(session_factory)
+        # The catalog is written through a repository of its own, so its session is never shared with requests.
+        catalog_repo = SqlAlchemyRepository(session_factory)
+        database_file = database_engine.url.database
         if app.config['TESTING'] == 'True' or len(database_engine.table_names()) == 0:
-            print("REPOPULATING DATABASE...")
             # For testing, or first-time use of the web application, reinitialise the database.
             clear_mappers()
-            metadata.create_all(database_engine)  # Conditionally create database tables.
-            for table in reversed(metadata.sorted_tables):  # Remove any data from the tables.
-                database_engine.execute(table.delete())
-
             # Generate mappings that map domain model classes to the database tables.
             map_model_to_tables()
 
-            database_mode = True
-            populate_two(data_path, repo.repo_instance, database_mode)
-            print("REPOPULATING DATABASE... FINISHED")
+            # The database file is replaced or emptied before the app serves any request, even with
+            # CATALOG_BACKGROUND_LOAD, so no user registered meanwhile is lost with the old rows.
+            print("REPOPULATING DATABASE...")
+            # A prebuilt catalog database (see flask build-catalog) replaces the database file when it is still
+            # valid for the csv files, otherwise the database is populated from the csv files.
+            # Pooled connections to the database file are closed before it may be replaced.
+            database_engine.dispose()
+            if app.config['CATALOG_ARTIFACT'] and database_file not in (None, '', ':memory:') and \
+                    install_catalog_artifact(app.config['CATALOG_ARTIFACT'], database_file, data_path):
+                metadata.create_all(database_engine)
+                migrate_database(database_engine)
+                print(f"REPOPULATING DATABASE... FINISHED (copied {app.config['CATALOG_ARTIFACT']})")
+            else:
+                metadata.create_all(database_engine)  # Conditionally create database tables.
+                for table in reversed(metadata.sorted_tables):  # Remove any data from the tables.
+                    database_engine.execute(table.delete())
+                # Indexes of existing tables are only created by the migrations.
+                migrate_database(database_engine)
+
+                def populate_database_catalog():
+                    database_mode = True
+                    reader = populate_two(data_path, catalog_repo, database_mode, app.config['CATALOG_WORKERS'],
+                                          app.config['CATALOG_CACHE_DIR'])
+                    catalog_repo.close_session()
+                    for csv_file, stats in reader.shard_stats.items():
+                        print(f"    {csv_file}: {stats.rows} rows in {stats.seconds:.2f}s")
+                    print(f"REPOPULATING DATABASE... FINISHED "
+                          f"({reader.track_parse_stats.rows_per_second:.0f} track rows/sec)")
+
+                catalog_loader = populate_database_catalog
 
         else:
+            # Tables added since the database was created, e.g. catalog_rows, are created; existing ones are kept.
+            metadata.create_all(database_engine)
+            # Indexes and other schema changes added since the database was created are applied without
+            # repopulating it (see flask migrate-database).
+            with database_engine.connect() as connection:
+                is_outdated = get_schema_version(connection) < SCHEMA_VERSION
+            plans_before = explain_hot_queries(database_engine) if is_outdated else None
+            applied = migrate_database(database_engine)
+            if applied:
+                startup_migration.update(applied=applied, plans_before=plans_before)
+                print(f"MIGRATED DATABASE to schema version {applied[-1]}")
             # Solely generate mappings that map domain model classes to the database tables.
             map_model_to_tables()
 
+            if app.config['CATALOG_REFRESH']:
+                def refresh_database_catalog():
+                    print("REFRESHING CATALOG...")
+                    delta = refresh_catalog(data_path, catalog_repo, app.config['CATALOG_WORKERS'],
+                                            app.config['CATALOG_CACHE_DIR'])
+                    catalog_repo.close_session()
+                    print(f"REFRESHING CATALOG... FINISHED ({delta.added} added, {delta.updated} updated, "
+                          f"{delta.removed} removed, {delta.unchanged} unchanged)")
+
+                catalog_loader = refresh_database_catalog
+
+    def load_track_details():
+        # Extended track metadata is read by track pages from the tracks csv files, or from the UTF-8 copies the
+        # catalog was just read from. The rows are indexed here, before any page asks for them.
+        details_reader = catalog_reader([], find_catalog_files(data_path)[1], cache_dir=app.config['CATALOG_CACHE_DIR'])
+        details = track_details.TrackDetails(details_reader.source_files, details_reader.encoding,
+                                             cache_size=app.config['CATALOG_DETAILS_CACHE_SIZE'])
+        details.build_index()
+        track_details.details_instance = details
+
+    def load_catalog_and_track_details():
+        if catalog_loader is not None:
+            catalog_loader()
+        load_track_details()
+
+    # With CATALOG_BACKGROUND_LOAD the app starts right away, serving /healthz and /readyz, and answers catalog
+    # routes with 503 until the catalog has loaded.
+    catalog_warmup.warmup_instance = None
+    track_details.details_instance = None
+    if catalog_loader is not None and app.config['CATALOG_BACKGROUND_LOAD']:
+        catalog_warmup.warmup_instance = catalog_warmup.CatalogWarmup(load_catalog_and_track_details).start()
+    else:
+        load_catalog_and_track_details()
+
+    @app.cli.command('build-catalog')
+    @click.option('--output', default=None, help='Catalog database to write, CATALOG_ARTIFACT by default.')
+    def build_catalog_command(output):
+        """ Builds the indexed catalog database that create_app copies instead of populating the database. """
+        artifact_file = output or app.config['CATALOG_ARTIFACT'] or str(Path(__file__).parent.parent / 'catalog.db')
+        manifest = build_catalog_artifact(data_path, artifact_file, app.config['CATALOG_WORKERS'],
+                                          app.config['CATALOG_CACHE_DIR'])
+        click.echo(f"Built {artifact_file} ({manifest['size']} bytes, sha256 {manifest['sha256']}) "
+                   f"in {manifest['build_seconds']}s")
+
+    @app.cli.command('migrate-database')
+    @click.option('--explain/--no-explain', default=True, help='Show the query plans of the hot queries.')
+    def migrate_database_command(explain):
+        """ Brings the schema of the database up to date, showing the query plans before and after. """
+        engine = create_database_engine(app.config['SQLALCHEMY_DATABASE_URI'],
+                                        performance_profile=app.config['SQLITE_PERFORMANCE_PROFILE'])
+        metadata.create_all(engine)
+        plans_before = explain_hot_queries(engine) if explain else None
+        applied = migrate_database(engine)
+        if not applied and startup_migration['applied']:
+            # create_app migrated the database of the app just before this command ran, report that migration once.
+            applied, plans_before = startup_migration['applied'], startup_migration['plans_before']
+            startup_migration.update(applied=[], plans_before=None)
+        with engine.connect() as connection:
+            version = get_schema_version(connection)
+        if applied:
+            click.echo(f"Applied migration(s) {', '.join(str(v) for v in applied)}, schema version is now {version}")
+        else:
+            click.echo(f"Schema version {version} is up to date")
+
+        if explain:
+            for name, plan_after in explain_hot_queries(engine).items():
+                click.echo(f"{name}:")
+                click.echo(f"    before: {'; '.join(plans_before[name])}")
+                click.echo(f"    after:  {'; '.join(plan_after)}")
+        engine.dispose()
+
     # Build the application - these steps require an application context.
     with app.app_context():
         # Register blueprints.
+        from .health import health
+        app.register_blueprint(health.health_blueprint)
+
         from .home import home
         app.register_blueprint(home.home_blueprint)
     
@@ -0,0 +1,111 @@
+import json
+import os
+import shutil
+import sqlite3
+import time
+from pathlib import Path
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
+
+from music.adapters.orm import metadata
+from music.adapters.csvdatareader import find_catalog_files
+from music.adapters.catalog_snapshot import file_hash, fingerprint_file, fingerprints_match
+from music.adapters import database_repository
+from music.adapters.migrations import migrate_database
+
+# Bump whenever the schema or the way the artifact is built changes, so old artifacts are rebuilt.
+ARTIFACT_VERSION = 4
+
+
+def manifest_file_name(artifact_file: str) -> str:
+    return f'{artifact_file}.manifest.json'
+
+
+def build_catalog_artifact(data_path: Path, artifact_file: str, workers: int = 1, cache_dir: str = None) -> dict:
+    """ Builds a ready to use SQLite catalog database from the csv files at data_path. Returns its manifest.
+
+    The database is populated, migrated to the current schema version, analysed and vacuumed. The manifest, written
+    next to it, holds the sha256 of the database and the fingerprints of the csv files it was built from. The csv files
+    are named relative to data_path, so the artifact can be built in one checkout, e.g. by CI, and used in another.
+    """
+    albums_file_names, tracks_file_names = find_catalog_files(data_path)
+    if not tracks_file_names:
+        raise ValueError(f"no track csv files found at {data_path}")
+
+    artifact_file = os.path.abspath(artifact_file)
+    os.makedirs(os.path.dirname(artifact_file), exist_ok=True)
+    temporary_file = f'{artifact_file}.{os.getpid()}.tmp'
+    if os.path.exists(temporary_file):
+        os.remove(temporary_file)
+
+    start = time.perf_counter()
+    engine = create_engine(f'sqlite:///{temporary_file}', poolclass=NullPool)
+    metadata.create_all(engine)
+    repo = database_repository.SqlAlchemyRepository(sessionmaker(bind=engine))
+    reader = database_repository.populate_two(data_path, repo, True, workers, cache_dir)
+    repo.close_session()
+    # The indexes come with the tables, this only records the schema version so the app does not migrate it again.
+    migrate_database(engine)
+    engine.dispose()
+
+    # VACUUM can not run inside a transaction, so the statements are run in autocommit mode.
+    connection = sqlite3.connect(temporary_file, isolation_level=None)
+    try:
+        connection.execute('ANALYZE')
+        connection.execute('VACUUM')
+    finally:
+        connection.close()
+    os.replace(temporary_file, artifact_file)
+
+    manifest = {
+        'version': ARTIFACT_VERSION,
+        'sha256': file_hash(artifact_file),
+        'size': os.path.getsize(artifact_file),
+        'track_rows': reader.track_parse_stats.rows,
+        'build_seconds': round(time.perf_counter() - start, 3),
+        'sources': [fingerprint_file(path, data_path) for path in albums_file_names + tracks_file_names]
+    }
+    with open(manifest_file_name(artifact_file), 'w', encoding='utf-8') as manifest_file:
+        json.dump(manifest, manifest_file, indent=2)
+    return manifest
+
+
+def verify_catalog_artifact(artifact_file: str, data_path: Path) -> str:
+    """ Returns why the artifact can not be used for the csv files at data_path, or None if it can. """
+    try:
+        with open(manifest_file_name(artifact_file), encoding='utf-8') as manifest_file:
+            manifest = json.load(manifest_file)
+    except (OSError, ValueError) as e:
+        return f'no readable manifest ({e})'
+
+    try:
+        if manifest.get('version') != ARTIFACT_VERSION:
+            return 'it was built by another version'
+        if not os.path.exists(artifact_file) or os.path.getsize(artifact_file) != manifest['size'] or \
+                file_hash(artifact_file) != manifest['sha256']:
+            return 'its checksum does not match the manifest'
+        albums_file_names, tracks_file_names = find_catalog_files(data_path)
+        if not fingerprints_match(manifest['sources'], albums_file_names + tracks_file_names, data_path):
+            return 'the csv files changed since it was built'
+    except (KeyError, TypeError) as e:
+        return f'its manifest is invalid ({e})'
+    return None
+
+
+def install_catalog_artifact(artifact_file: str, database_file: str, data_path: Path) -> bool:
+    """ Copies a verified artifact over database_file. Returns False, leaving database_file as it is, otherwise. """
+    problem = verify_catalog_artifact(artifact_file, data_path)
+    if problem is not None:
+        print(f'Not using the catalog artifact {artifact_file}: {problem}')
+        return False
+
+    temporary_file = f'{database_file}.{os.getpid()}.tmp'
+    shutil.copyfile(artifact_file, temporary_file)
+    # A write-ahead log left by the replaced database (SQLITE_PERFORMANCE_PROFILE) would be replayed into the new one.
+    for journal_file in (f'{database_file}-wal', f'{database_file}-shm'):
+        if os.path.exists(journal_file):
+            os.remove(journal_file)
+    os.replace(temporary_file, database_file)
+    return True
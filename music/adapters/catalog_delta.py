@@ -0,0 +1,119 @@
+import hashlib
+from pathlib import Path
+
+from music.domainmodel.album import Album
+from music.domainmodel.track import Track
+from music.adapters.csvdatareader import find_catalog_files
+from music.adapters.catalog_snapshot import catalog_reader
+
+# Entity names under which row hashes are stored.
+TRACK_ENTITY = 'track'
+ALBUM_ENTITY = 'album'
+
+
+def row_hash(values) -> str:
+    """ Returns the sha1 hex digest of a row of values. """
+    # Unit separator, it cannot appear in the csv values, so two different rows never join to the same text.
+    return hashlib.sha1('\x1f'.join(str(value) for value in values).encode('utf-8')).hexdigest()
+
+
+def track_row_hash(track: Track) -> str:
+    """ Hashes the columns of a track row that the repositories store, so edits to other columns are ignored. """
+    artist = track.artist
+    return row_hash((
+        track.track_id, track.title, track.track_url, track.track_duration,
+        artist.artist_id if artist is not None else None, artist.full_name if artist is not None else None,
+        track.album.album_id if track.album is not None else None,
+        *(f'{genre.genre_id}:{genre.name}' for genre in track.genres)
+    ))
+
+
+def album_row_hash(album: Album) -> str:
+    """ Hashes the columns of an album row that the repositories store. """
+    return row_hash((album.album_id, album.title, album.album_url, album.album_type, album.release_year))
+
+
+class CatalogDelta:
+    """ Number of rows added, updated, removed and left unchanged by a catalog refresh. """
+
+    def __init__(self):
+        self.__counts = dict.fromkeys(('added', 'updated', 'removed', 'unchanged', 'albums_changed'), 0)
+
+    @property
+    def added(self) -> int:
+        return self.__counts['added']
+
+    @property
+    def updated(self) -> int:
+        return self.__counts['updated']
+
+    @property
+    def removed(self) -> int:
+        return self.__counts['removed']
+
+    @property
+    def unchanged(self) -> int:
+        return self.__counts['unchanged']
+
+    @property
+    def albums_changed(self) -> int:
+        return self.__counts['albums_changed']
+
+    @property
+    def rows_written(self) -> int:
+        return self.added + self.updated + self.removed + self.albums_changed
+
+    def count(self, change: str, rows: int = 1):
+        self.__counts[change] += rows
+
+    def __repr__(self) -> str:
+        return (f"<CatalogDelta {self.added} added, {self.updated} updated, {self.removed} removed, "
+                f"{self.unchanged} unchanged, {self.albums_changed} albums changed>")
+
+
+def refresh_catalog(data_path: Path, repo, workers: int = 1, cache_dir: str = None) -> CatalogDelta:
+    """ Brings an already populated repository up to date with the catalog at data_path.
+
+    Every track and album row is hashed and compared with the hash stored for it. Only new or changed rows are
+    written, and tracks that are no longer in the catalog are tombstoned: they disappear from listings and
+    searches, but users' reviews, likes and playlists keep referring to them. With a cache_dir the csv files are
+    read from UTF-8 copies kept there.
+    """
+    albums_file_names, tracks_file_names = find_catalog_files(data_path)
+    if not tracks_file_names:
+        # An empty or missing catalog would tombstone every track.
+        raise ValueError(f"no track csv files found at {data_path}")
+    reader = catalog_reader(albums_file_names, tracks_file_names, True, cache_dir)
+
+    delta = CatalogDelta()
+    stored_track_hashes = repo.get_catalog_row_hashes(TRACK_ENTITY)
+    stored_album_hashes = repo.get_catalog_row_hashes(ALBUM_ENTITY)
+    album_ids, track_ids = set(), set()
+
+    for track in reader.iter_tracks(workers):
+        album = track.album
+        if album is not None and album.album_id not in album_ids:
+            album_ids.add(album.album_id)
+            album_hash = album_row_hash(album)
+            if stored_album_hashes.get(album.album_id) != album_hash:
+                repo.upsert_album(album, album_hash)
+                delta.count('albums_changed')
+
+        track_ids.add(track.track_id)
+        track_hash = track_row_hash(track)
+        stored_hash = stored_track_hashes.get(track.track_id)
+        if stored_hash == track_hash:
+            delta.count('unchanged')
+        elif stored_hash is None:
+            repo.upsert_track(track, track_hash)
+            delta.count('added')
+        else:
+            repo.upsert_track(track, track_hash)
+            delta.count('updated')
+
+    removed_track_ids = [track_id for track_id in stored_track_hashes if track_id not in track_ids]
+    if removed_track_ids:
+        repo.remove_tracks(removed_track_ids)
+        delta.count('removed', len(removed_track_ids))
+
+    return delta
@@ -0,0 +1,214 @@
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import time
+
+from music.adapters.csvdatareader import ParseStats, TrackCSVReader, NORMALISED_FILE_SUFFIX
+
+# Bump whenever the layout of the pickled catalog or of the domain model changes, so old snapshots are rebuilt.
+SNAPSHOT_VERSION = 1
+
+
+def file_hash(path: str) -> str:
+    """ Returns the sha256 hex digest of the content of the file at path. """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as source:
+        for block in iter(lambda: source.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def source_name(path: str, root: str = None) -> str:
+    """ Returns the absolute path of a source file, or its path relative to root, the same in every checkout. """
+    if root is None:
+        return os.path.abspath(path)
+    return os.path.relpath(os.path.abspath(path), os.path.abspath(root)).replace(os.sep, '/')
+
+
+def fingerprint_file(path: str, root: str = None) -> dict:
+    """ Returns the path (see source_name), size, mtime and content hash of a source file. """
+    status = os.stat(path)
+    return {
+        'path': source_name(path, root),
+        'size': status.st_size,
+        'mtime_ns': status.st_mtime_ns,
+        'sha256': file_hash(path)
+    }
+
+
+def fingerprints_match(fingerprints: list, source_files: list, root: str = None) -> bool:
+    """ Checks the stored fingerprints against the current state of source_files.
+
+    Size and mtime are compared first. Only a file whose mtime changed while its size did not is hashed again, so a
+    touched but unchanged file still matches. With a root, paths are compared relative to it, so fingerprints taken
+    in another checkout match files with the same content; their mtimes differ, so those files are always hashed.
+    """
+    if len(fingerprints) != len(source_files):
+        return False
+
+    for fingerprint, path in zip(fingerprints, source_files):
+        if fingerprint['path'] != source_name(path, root) or not os.path.exists(path):
+            return False
+        status = os.stat(path)
+        if status.st_size != fingerprint['size']:
+            return False
+        if status.st_mtime_ns != fingerprint['mtime_ns'] and file_hash(path) != fingerprint['sha256']:
+            return False
+
+    return True
+
+
+class CatalogSnapshot:
+    """ The parsed catalog, as stored on disk. Has the same dataset properties as TrackCSVReader. """
+
+    def __init__(self, tracks: list, artists: set, albums: set, genres: set):
+        self.__dataset_of_tracks = tracks
+        self.__dataset_of_artists = artists
+        self.__dataset_of_albums = albums
+        self.__dataset_of_genres = genres
+        self.__track_parse_stats = ParseStats()
+
+    @property
+    def dataset_of_tracks(self) -> list:
+        return self.__dataset_of_tracks
+
+    @property
+    def dataset_of_albums(self) -> set:
+        return self.__dataset_of_albums
+
+    @property
+    def dataset_of_artists(self) -> set:
+        return self.__dataset_of_artists
+
+    @property
+    def dataset_of_genres(self) -> set:
+        return self.__dataset_of_genres
+
+    @property
+    def track_parse_stats(self) -> ParseStats:
+        """ Tracks loaded from the snapshot and the time it took. """
+        return self.__track_parse_stats
+
+    def __getstate__(self):
+        # Only the datasets are stored, parse stats belong to the process that loads the snapshot.
+        return (self.__dataset_of_tracks, self.__dataset_of_artists, self.__dataset_of_albums,
+                self.__dataset_of_genres)
+
+    def __setstate__(self, state):
+        self.__init__(*state)
+
+
+def snapshot_file_name(source_files: list) -> str:
+    """ Returns the snapshot file name for a set of source files, so several catalogs can share a cache folder. """
+    paths = '\n'.join(os.path.abspath(path) for path in source_files)
+    return f"catalog-{hashlib.sha1(paths.encode('utf-8')).hexdigest()[:16]}.snapshot"
+
+
+def load_snapshot(snapshot_file: str, source_files: list):
+    """ Returns the CatalogSnapshot stored in snapshot_file, or None if it is missing, unreadable or stale. """
+    start = time.perf_counter()
+    try:
+        with open(snapshot_file, 'rb') as snapshot:
+            # The header is pickled on its own, so a stale snapshot is detected without loading the catalog.
+            header = pickle.load(snapshot)
+            if header.get('version') != SNAPSHOT_VERSION or not fingerprints_match(header['sources'], source_files):
+                return None
+            catalog = pickle.load(snapshot)
+    except (OSError, EOFError, pickle.UnpicklingError, AttributeError, KeyError, TypeError):
+        return None
+
+    catalog.track_parse_stats.add(len(catalog.dataset_of_tracks), time.perf_counter() - start)
+    return catalog
+
+
+def save_snapshot(snapshot_file: str, source_files: list, catalog):
+    """ Writes the datasets of catalog (a TrackCSVReader or CatalogSnapshot) to snapshot_file. """
+    header = {
+        'version': SNAPSHOT_VERSION,
+        'sources': [fingerprint_file(path) for path in source_files]
+    }
+    snapshot = CatalogSnapshot(list(catalog.dataset_of_tracks), set(catalog.dataset_of_artists),
+                               set(catalog.dataset_of_albums), set(catalog.dataset_of_genres))
+
+    os.makedirs(os.path.dirname(os.path.abspath(snapshot_file)), exist_ok=True)
+    # Write to a temporary file first, so a concurrent start never reads a half written snapshot.
+    temporary_file = f'{snapshot_file}.{os.getpid()}.tmp'
+    with open(temporary_file, 'wb') as output:
+        pickle.dump(header, output, protocol=pickle.HIGHEST_PROTOCOL)
+        pickle.dump(snapshot, output, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temporary_file, snapshot_file)
+
+
+def normalised_file_name(source_file: str) -> str:
+    """ Returns the file name of the UTF-8 copy of source_file, unique per source path. """
+    stem = os.path.splitext(os.path.basename(source_file))[0]
+    return f"{stem}-{hashlib.sha1(os.path.abspath(source_file).encode('utf-8')).hexdigest()[:16]}{NORMALISED_FILE_SUFFIX}"
+
+
+def normalise_csv_file(source_file: str, cache_dir: str) -> str:
+    """ Returns a UTF-8 copy of the unicode_escape encoded source_file in cache_dir.
+
+    The copy holds the same decoded text, so it parses to the same rows with the much faster native codec. It is
+    only converted again when source_file changes. Raises UnicodeEncodeError if the text can not be UTF-8 encoded.
+    """
+    normalised_file = os.path.join(cache_dir, normalised_file_name(source_file))
+    # The fingerprint of the source file the copy was made from is kept next to it.
+    source_fingerprint_file = f'{normalised_file}.source'
+    try:
+        with open(source_fingerprint_file, encoding='utf-8') as fingerprint:
+            if os.path.exists(normalised_file) and fingerprints_match([json.load(fingerprint)], [source_file]):
+                return normalised_file
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+
+    os.makedirs(cache_dir, exist_ok=True)
+    temporary_file = f'{normalised_file}.{os.getpid()}.tmp'
+    try:
+        # newline='' on both sides copies line endings as they are, the csv reader handles them like before.
+        with open(source_file, encoding='unicode_escape', newline='') as source, \
+                open(temporary_file, 'w', encoding='utf-8', newline='') as target:
+            shutil.copyfileobj(source, target, 1024 * 1024)
+    except UnicodeEncodeError:
+        os.remove(temporary_file)
+        raise
+    os.replace(temporary_file, normalised_file)
+    with open(source_fingerprint_file, 'w', encoding='utf-8') as fingerprint:
+        json.dump(fingerprint_file(source_file), fingerprint)
+    return normalised_file
+
+
+def catalog_reader(albums_csv_files: list, tracks_csv_files: list, database_mode=False, cache_dir: str = None):
+    """ Returns a TrackCSVReader for the catalog, reading UTF-8 copies kept in cache_dir when it is given.
+
+    Falls back to the source files if they can not be copied, e.g. when the cache folder is read only.
+    """
+    if not cache_dir:
+        return TrackCSVReader(albums_csv_files, tracks_csv_files, database_mode)
+    try:
+        return TrackCSVReader([normalise_csv_file(csv_file, cache_dir) for csv_file in albums_csv_files],
+                              [normalise_csv_file(csv_file, cache_dir) for csv_file in tracks_csv_files],
+                              database_mode, encoding='utf-8')
+    except (OSError, UnicodeEncodeError) as e:
+        print(f'Could not normalise the catalog csv files to UTF-8 in {cache_dir}: {e}')
+        return TrackCSVReader(albums_csv_files, tracks_csv_files, database_mode)
+
+
+def read_catalog(reader: TrackCSVReader, source_files: list, cache_dir: str, workers: int = 1):
+    """ Returns the catalog of the given reader, from the snapshot in cache_dir when it is up to date.
+
+    Otherwise the csv files are read and a new snapshot is written for the next start.
+    """
+    snapshot_file = os.path.join(cache_dir, snapshot_file_name(source_files))
+    catalog = load_snapshot(snapshot_file, source_files)
+    if catalog is not None:
+        return catalog
+
+    reader.read_csv_files(workers)
+    try:
+        save_snapshot(snapshot_file, source_files, reader)
+    except OSError as e:
+        # The catalog is still usable, the next start just has to parse the csv files again.
+        print(f'Could not write the catalog snapshot {snapshot_file}: {e}')
+    return reader
@@ -0,0 +1,63 @@
+import threading
+import time
+import traceback
+
+# Seconds a client is asked to wait before retrying a catalog route while the catalog is loading.
+RETRY_AFTER_SECONDS = 5
+
+warmup_instance = None
+
+
+def catalog_is_ready() -> bool:
+    """ Returns True when the catalog can be served, always the case when it was loaded before the app started. """
+    return warmup_instance is None or warmup_instance.is_ready
+
+
+class CatalogWarmup:
+    """ Loads the catalog on a background thread, so the app can answer requests while the catalog is loading.
+
+    load is called without arguments. The catalog is ready once it returned; if it raised, the catalog never
+    becomes ready and the error is kept.
+    """
+
+    def __init__(self, load):
+        self.__load = load
+        self.__is_ready = False
+        self.__error = None
+        self.__seconds = None
+        self.__finished = threading.Event()
+        self.__thread = threading.Thread(target=self.__run, name='catalog-warmup', daemon=True)
+
+    @property
+    def is_ready(self) -> bool:
+        return self.__is_ready
+
+    @property
+    def error(self):
+        return self.__error
+
+    @property
+    def seconds(self):
+        """ Time it took to load the catalog, None while it is loading. """
+        return self.__seconds
+
+    def start(self):
+        self.__thread.start()
+        return self
+
+    def wait(self, timeout: float = None) -> bool:
+        """ Waits until loading finished, successfully or not. Returns False if it is still loading after timeout. """
+        return self.__finished.wait(timeout)
+
+    def __run(self):
+        start = time.perf_counter()
+        try:
+            self.__load()
+            self.__is_ready = True
+        except Exception as e:
+            self.__error = e
+            print('LOADING CATALOG... FAILED')
+            traceback.print_exc()
+        finally:
+            self.__seconds = time.perf_counter() - start
+            self.__finished.set()
@@ -1,6 +1,16 @@
 import os
 import csv
 import ast
+import glob
+import io
+import mmap
+import re
+import time
+from collections import deque
+from itertools import islice
+from concurrent.futures import ProcessPoolExecutor
+from operator import itemgetter
+from pathlib import Path
 from xmlrpc.client import Boolean
 
 from music.domainmodel.artist import Artist
@@ -9,6 +19,287 @@ from music.domainmodel.track import Track
 from music.domainmodel.genre import Genre
 
 
+# File names of the album and track csv shards in a catalog folder.
+ALBUM_FILE_PATTERN = 'raw_albums_excerpt*.csv'
+TRACK_FILE_PATTERN = 'raw_tracks_excerpt*.csv'
+# Suffix of the UTF-8 copies of the csv files kept in CATALOG_CACHE_DIR, which also match the patterns above.
+NORMALISED_FILE_SUFFIX = '.utf8.csv'
+
+# Approximate number of bytes of the tracks csv file handed to a worker process at a time.
+CHUNK_SIZE = 4 * 1024 * 1024
+
+# Number of rows parsed at a time when reading without worker processes, so the parse time is measured once per batch
+# instead of once per row.
+ROW_BATCH_SIZE = 1024
+
+# The only columns of the tracks csv file that are used to build Track, Artist and Genre objects.
+TRACK_COLUMNS = ('track_id', 'track_title', 'track_url', 'track_duration', 'artist_id', 'artist_name', 'album_id',
+                 'track_genres')
+
+# The only columns of the albums csv file that are used to build Album objects.
+ALBUM_COLUMNS = ('album_id', 'album_title', 'album_url', 'album_type', 'album_year_released')
+
+
+class ParseStats:
+    """ Running count of the csv rows parsed and the time spent parsing them. """
+
+    def __init__(self):
+        self.__rows: int = 0
+        self.__seconds: float = 0.0
+
+    @property
+    def rows(self) -> int:
+        return self.__rows
+
+    @property
+    def seconds(self) -> float:
+        return self.__seconds
+
+    @property
+    def rows_per_second(self) -> float:
+        if self.__seconds <= 0:
+            return 0.0
+        return self.__rows / self.__seconds
+
+    def add(self, rows: int, seconds: float):
+        self.__rows += rows
+        self.__seconds += seconds
+
+    def __repr__(self) -> str:
+        return f"<ParseStats {self.rows} rows, {self.rows_per_second:.0f} rows/sec>"
+
+
+def iter_projected_rows(csv_file: str, columns: tuple, encoding='unicode_escape'):
+    """ Yields a dict holding only the given columns for every row of csv_file.
+
+    The header is resolved to column positions once, so each row is sliced by position instead of building a dict
+    with every column of the file. Missing trailing fields are None, like csv.DictReader.
+    """
+    # encoding of unicode_escape is required to decode successfully
+    with open(csv_file, encoding=encoding) as csv_source:
+        yield from project_rows(csv_source, columns, csv_file)
+
+
+def project_rows(csv_source, columns: tuple, source_name='csv'):
+    """ Projects the rows of an open csv text source (header line first), see iter_projected_rows. """
+    reader = csv.reader(csv_source)
+    header = next(reader, None)
+    if header is None:
+        return
+
+    try:
+        positions = [header.index(column) for column in columns]
+    except ValueError:
+        missing = [column for column in columns if column not in header]
+        raise ValueError(f'{source_name} has no column(s) {", ".join(missing)}')
+    # itemgetter returns a bare value instead of a tuple when given a single position.
+    project = itemgetter(*positions) if len(positions) > 1 else lambda row: (row[positions[0]],)
+    width = max(positions) + 1
+
+    for row in reader:
+        if not row:
+            # csv.DictReader skips blank lines as well.
+            continue
+        if len(row) >= width:
+            values = project(row)
+        else:
+            values = tuple(row[position] if position < len(row) else None for position in positions)
+        yield dict(zip(columns, values))
+
+
+def find_record_end(data, start: int, position: int, escaped: bool = True) -> int:
+    """ Returns the offset just after the first record boundary at or after position, for a record starting at start.
+
+    A record boundary is a newline that is not inside a quoted (possibly multi-line) field. data can be bytes or an
+    mmap of a csv file, escaped tells whether it is decoded with unicode_escape.
+    """
+    quotes = 0
+    counted_to = start
+    while True:
+        newline = data.find(b'\n', position)
+        if newline == -1:
+            return len(data)
+        quotes += data[counted_to:newline].count(b'"')
+        counted_to = newline
+        # An even number of quotes means the newline is not inside a quoted field. A backslash before the newline
+        # would join the lines once unicode_escape decoded, so the record can not end there either.
+        if quotes % 2 == 0 and not (escaped and data[newline - 1:newline] == b'\\'):
+            return newline + 1
+        position = newline + 1
+
+
+def split_csv_records(data, chunk_size: int, start: int = 0, escaped: bool = True) -> list:
+    """ Splits data, from start onwards, into (start, end) byte ranges of about chunk_size bytes.
+
+    Every range ends on a record boundary, so each one can be parsed on its own.
+    """
+    ranges = []
+    while start < len(data):
+        end = find_record_end(data, start, min(start + chunk_size, len(data)) - 1, escaped)
+        ranges.append((start, end))
+        start = end
+    return ranges
+
+
+def parse_track_chunk(csv_file: str, header: bytes, start: int, end: int, encoding='unicode_escape') -> tuple:
+    """ Returns the projected TRACK_COLUMNS rows of the byte range [start, end) of csv_file and the parse time.
+
+    Runs in a worker process of TrackCSVReader.iter_tracks, so it only returns plain dicts of strings.
+    """
+    with open(csv_file, 'rb') as csv_bytes:
+        csv_bytes.seek(start)
+        chunk = csv_bytes.read(end - start)
+    parse_start = time.perf_counter()
+    csv_source = io.TextIOWrapper(io.BytesIO(header + chunk), encoding=encoding)
+    track_rows = list(project_rows(csv_source, TRACK_COLUMNS, csv_file))
+    return track_rows, time.perf_counter() - parse_start
+
+
+class EntityRegistry:
+    """ Hands out a single canonical Artist, Album and Genre instance per id while a catalog is read.
+
+    Every Track then references the same objects, instead of one duplicate per csv row.
+    """
+
+    def __init__(self):
+        self.__artists = dict()
+        self.__albums = dict()
+        self.__genres = dict()
+
+    @property
+    def artists(self) -> list:
+        return list(self.__artists.values())
+
+    @property
+    def albums(self) -> list:
+        return list(self.__albums.values())
+
+    @property
+    def genres(self) -> list:
+        return list(self.__genres.values())
+
+    def artist(self, artist_id: int, full_name: str) -> Artist:
+        artist = self.__artists.get(artist_id)
+        if artist is None:
+            artist = self.__artists[artist_id] = Artist(artist_id, full_name)
+        return artist
+
+    def genre(self, genre_id: int, name: str) -> Genre:
+        genre = self.__genres.get(genre_id)
+        if genre is None:
+            genre = self.__genres[genre_id] = Genre(genre_id, name)
+        return genre
+
+    def album(self, album: Album) -> Album:
+        """ Returns the canonical instance for the id of album, registering album if it is the first one. """
+        return self.__albums.setdefault(album.album_id, album)
+
+
+def read_csv_header(data, encoding: str = 'unicode_escape') -> tuple:
+    """ Returns the end offset and the column names of the header line of the memory-mapped csv data. """
+    header_end = find_record_end(data, 0, 0, encoding == 'unicode_escape')
+    columns = next(csv.reader(io.TextIOWrapper(io.BytesIO(data[:header_end]), encoding=encoding)), [])
+    return header_end, columns
+
+
+def iter_record_ids(data, start: int, id_position: int, encoding: str = 'unicode_escape'):
+    """ Yields (raw id, start, end) for every non blank record of the memory-mapped csv data from start onwards.
+
+    The raw id is the bytes of the field at id_position. It is sliced out directly when it is the first field,
+    as in the FMA files, so the rest of the record is never parsed.
+    """
+    escaped = encoding == 'unicode_escape'
+    while start < len(data):
+        end = find_record_end(data, start, start, escaped)
+        if id_position == 0:
+            comma = data.find(b',', start, end)
+            raw_id = data[start:comma if comma != -1 else end].strip()
+        else:
+            row = next(csv.reader(io.TextIOWrapper(io.BytesIO(data[start:end]), encoding=encoding)), [])
+            raw_id = row[id_position].strip().encode() if len(row) > id_position else b''
+        if raw_id:
+            yield raw_id, start, end
+        start = end
+
+
+class AlbumIndex:
+    """ Maps album_id to Album over memory-mapped album csv files, materialising each Album on first access.
+
+    Building the index only reads the album_id of every row and records the byte range of the row, so albums
+    that no track references are never parsed. Like read_albums_file_as_dict, the first row of an id wins.
+    """
+
+    def __init__(self, albums_csv_files: list, encoding: str = 'unicode_escape', shard_stats: dict = None):
+        self.__encoding = encoding
+        self.__maps = []
+        self.__headers = []
+        # album_id -> (map index, start, end)
+        self.__offsets = dict()
+        self.__albums = dict()
+        for albums_csv_file in albums_csv_files:
+            if not os.path.exists(albums_csv_file):
+                print(f"path {albums_csv_file} does not exist!")
+                continue
+            stats = ParseStats()
+            if shard_stats is not None:
+                shard_stats[albums_csv_file] = stats
+            start = time.perf_counter()
+            rows = self.__index_file(albums_csv_file)
+            stats.add(rows, time.perf_counter() - start)
+
+    def __index_file(self, albums_csv_file: str) -> int:
+        if os.path.getsize(albums_csv_file) == 0:
+            return 0
+        with open(albums_csv_file, 'rb') as album_csv:
+            # The map stays valid once the file is closed.
+            data = mmap.mmap(album_csv.fileno(), 0, access=mmap.ACCESS_READ)
+        header_end, columns = read_csv_header(data, self.__encoding)
+        if 'album_id' not in columns:
+            raise ValueError(f'{albums_csv_file} has no column(s) album_id')
+
+        map_index = len(self.__maps)
+        self.__maps.append(data)
+        self.__headers.append(data[:header_end])
+        rows = 0
+        for raw_album_id, start, end in iter_record_ids(data, header_end, columns.index('album_id'), self.__encoding):
+            rows += 1
+            if not raw_album_id.isdigit():
+                print(f'Invalid album_id: {raw_album_id.decode(errors="replace")}')
+            else:
+                self.__offsets.setdefault(int(raw_album_id), (map_index, start, end))
+        return rows
+
+    @property
+    def number_of_materialised_albums(self) -> int:
+        return len(self.__albums)
+
+    def __len__(self) -> int:
+        return len(self.__offsets)
+
+    def __contains__(self, album_id) -> bool:
+        return album_id in self.__offsets
+
+    def __getitem__(self, album_id) -> Album:
+        album = self.__albums.get(album_id)
+        if album is None:
+            map_index, start, end = self.__offsets[album_id]
+            data = self.__maps[map_index]
+            csv_source = io.TextIOWrapper(io.BytesIO(self.__headers[map_index] + data[start:end]),
+                                          encoding=self.__encoding)
+            album = self.__albums[album_id] = create_album_object(next(project_rows(csv_source, ALBUM_COLUMNS)))
+        return album
+
+    def get(self, album_id, default=None):
+        return self[album_id] if album_id in self.__offsets else default
+
+    def close(self):
+        """ Releases the maps of the files. Albums already materialised are kept by whoever read them. """
+        for data in self.__maps:
+            data.close()
+        self.__maps, self.__headers = [], []
+        self.__offsets = dict()
+
+
 def create_track_object(track_row):
     track = Track(int(track_row['track_id']), track_row['track_title'])
     track.track_url = track_row['track_url']
@@ -19,8 +310,10 @@ def create_track_object(track_row):
     return track
 
 
-def create_artist_object(track_row):
+def create_artist_object(track_row, registry: 'EntityRegistry' = None):
     artist_id = int(track_row['artist_id'])
+    if registry is not None:
+        return registry.artist(artist_id, track_row['artist_name'])
     artist = Artist(artist_id, track_row['artist_name'])
     return artist
 
@@ -37,40 +330,185 @@ def create_album_object(row):
     return album
 
 
-def extract_genres(track_row: dict):
+# One token of a track_genres value: a quoted string, a structural character or None.
+GENRE_TOKEN = re.compile(r"""\s*(?:'((?:[^'\\]|\\.)*)'|"((?:[^"\\]|\\.)*)"|([\[\]{}:,])|(None))""")
+
+
+def parse_genre_list(track_genres_raw: str) -> list:
+    """ Parses a track_genres value, e.g. "[{'genre_id': '21', 'genre_title': 'Hip-Hop'}]", into a list of dicts.
+
+    Only the list-of-flat-dicts literal written by the FMA export is understood. Any other input raises ValueError.
+    """
+    tokens = []
+    position = 0
+    while position < len(track_genres_raw):
+        match = GENRE_TOKEN.match(track_genres_raw, position)
+        if match is None:
+            if track_genres_raw[position:].strip() == '':
+                break
+            raise ValueError(f'unexpected character at position {position}')
+        single_quoted, double_quoted, symbol, none = match.groups()
+        if symbol is not None:
+            tokens.append((symbol, None))
+        elif none is not None:
+            tokens.append(('value', None))
+        else:
+            text = single_quoted if single_quoted is not None else double_quoted
+            if '\\' in text:
+                # Rare, let Python resolve the escape sequences of this one string literal.
+                text = ast.literal_eval(match.group(0).strip())
+            tokens.append(('value', text))
+        position = match.end()
+
+    def expect(index, kind):
+        if index >= len(tokens) or tokens[index][0] != kind:
+            raise ValueError(f"expected '{kind}' at token {index}")
+        return index + 1
+
+    genre_dicts = []
+    index = expect(0, '[')
+    if index < len(tokens) and tokens[index][0] == ']':
+        index += 1
+    else:
+        while True:
+            index = expect(index, '{')
+            genre_dict = dict()
+            if index < len(tokens) and tokens[index][0] == '}':
+                index += 1
+            else:
+                while True:
+                    key = tokens[index][1] if index < len(tokens) else None
+                    index = expect(index, 'value')
+                    index = expect(index, ':')
+                    value = tokens[index][1] if index < len(tokens) else None
+                    index = expect(index, 'value')
+                    genre_dict[key] = value
+                    if index + 1 < len(tokens) and tokens[index][0] == ',' and tokens[index + 1][0] != '}':
+                        index += 1
+                        continue
+                    if index < len(tokens) and tokens[index][0] == ',':
+                        # Trailing comma.
+                        index += 1
+                    index = expect(index, '}')
+                    break
+            genre_dicts.append(genre_dict)
+            if index + 1 < len(tokens) and tokens[index][0] == ',' and tokens[index + 1][0] != ']':
+                index += 1
+                continue
+            if index < len(tokens) and tokens[index][0] == ',':
+                # Trailing comma.
+                index += 1
+            index = expect(index, ']')
+            break
+    if index != len(tokens):
+        raise ValueError('unexpected data after the genre list')
+
+    return genre_dicts
+
+
+class GenreParser:
+    """ Turns track_genres values into Genre objects, parsing each distinct value only once.
+
+    The same Genre instance, taken from the registry, is returned for a genre id every time it appears. Values that
+    cannot be parsed are recorded in errors, one dict per offending row, instead of being printed.
+    """
+
+    def __init__(self, registry: EntityRegistry = None):
+        # raw track_genres value -> tuple of Genres, or the error message for a malformed value
+        self.__cache = dict()
+        self.__registry = registry if registry is not None else EntityRegistry()
+        self.__errors = []
+
+    @property
+    def errors(self) -> list:
+        return self.__errors
+
+    @property
+    def number_of_distinct_values(self) -> int:
+        return len(self.__cache)
+
+    def parse(self, track_genres_raw: str, track_id=None) -> tuple:
+        if not track_genres_raw:
+            return ()
+        try:
+            genres = self.__cache[track_genres_raw]
+        except KeyError:
+            genres = self.__cache[track_genres_raw] = self.__build_genres(track_genres_raw)
+
+        if type(genres) is str:
+            self.__errors.append({'track_id': track_id, 'value': track_genres_raw, 'error': genres})
+            return ()
+        return genres
+
+    def __build_genres(self, track_genres_raw: str):
+        try:
+            genres = []
+            for genre_dict in parse_genre_list(track_genres_raw):
+                genres.append(self.__registry.genre(int(genre_dict['genre_id']), genre_dict['genre_title']))
+            return tuple(genres)
+        except (ValueError, KeyError, TypeError) as e:
+            return f'Exception occurred while parsing genres: {e!r}'
+
+
+def extract_genres(track_row: dict, genre_parser: GenreParser = None):
     # List of dictionaries inside the string.
     track_genres_raw = track_row['track_genres']
+    if genre_parser is None:
+        genre_parser = GenreParser()
     # Populate genres. track_genres can be empty (None)
-    genres = []
-    if track_genres_raw:
-        try:
-            genre_dicts = ast.literal_eval(
-                track_genres_raw) if track_genres_raw != "" else []
+    return list(genre_parser.parse(track_genres_raw, track_row.get('track_id')))
+
 
-            for genre_dict in genre_dicts:
-                genre = Genre(
-                    int(genre_dict['genre_id']), genre_dict['genre_title'])
-                genres.append(genre)
-        except Exception as e:
-            print(track_genres_raw)
-            print(f'Exception occurred while parsing genres: {e}')
+def find_catalog_files(data_path) -> tuple:
+    """ Returns the sorted (album files, track files) csv shards of the catalog at data_path.
 
-    return genres
+    data_path is a folder, searched recursively for ALBUM_FILE_PATTERN and TRACK_FILE_PATTERN files, or a glob
+    pattern matching several such folders. UTF-8 copies of the files are left out, in case the cache folder is inside
+    data_path.
+    """
+    data_path = str(data_path)
+    folders = sorted(glob.glob(data_path)) if glob.has_magic(data_path) else [data_path]
+    album_files, track_files = [], []
+    for folder in folders:
+        if os.path.isdir(folder):
+            album_files += [str(path) for path in Path(folder).rglob(ALBUM_FILE_PATTERN)]
+            track_files += [str(path) for path in Path(folder).rglob(TRACK_FILE_PATTERN)]
+    album_files = [path for path in album_files if not path.endswith(NORMALISED_FILE_SUFFIX)]
+    track_files = [path for path in track_files if not path.endswith(NORMALISED_FILE_SUFFIX)]
+    return sorted(set(album_files)), sorted(set(track_files))
+
+
+def as_file_list(csv_files, argument_name: str) -> list:
+    if type(csv_files) is str:
+        return [csv_files]
+    if type(csv_files) in (list, tuple) and all(type(csv_file) is str for csv_file in csv_files):
+        return list(csv_files)
+    raise TypeError(f'{argument_name} should be a type of string, or a list of strings')
 
 
 class TrackCSVReader:
+    """ Reads the catalog from an albums and a tracks csv file, or from several shards of each.
 
-    def __init__(self, albums_csv_file: str, tracks_csv_file: str, database_mode: Boolean):
-        if type(albums_csv_file) is str:
-            self.__albums_csv_file = albums_csv_file
-        else:
-            raise TypeError('albums_csv_file should be a type of string')
+    Shards are merged in the order given. An album or track id that appears in more than one row is only read the
+    first time, artists, albums and genres are shared between shards through the registry.
+    """
 
-        if type(tracks_csv_file) is str:
-            self.__tracks_csv_file = tracks_csv_file
-        else:
-            raise TypeError('tracks_csv_file should be a type of string')
+    def __init__(self, albums_csv_file, tracks_csv_file, database_mode: Boolean, encoding: str = 'unicode_escape',
+                 lazy_albums: bool = True):
+        self.__albums_csv_files = as_file_list(albums_csv_file, 'albums_csv_file')
+        self.__tracks_csv_files = as_file_list(tracks_csv_file, 'tracks_csv_file')
         self.__database_mode = database_mode
+        # unicode_escape for the source csv files, utf-8 for their normalised copies
+        self.__encoding = encoding
+        # Resolve albums through an AlbumIndex instead of parsing every album row up front
+        self.__lazy_albums = lazy_albums
+        self.__album_index = None
+        self.__track_parse_stats = ParseStats()
+        # csv file -> ParseStats, for every album and track shard read
+        self.__shard_stats = dict()
+        # Canonical Artist, Album and Genre instances, shared by every track read
+        self.__registry = EntityRegistry()
+        self.__genre_parser = GenreParser(self.__registry)
 
         # List of unique tracks
         self.__dataset_of_tracks = []
@@ -81,6 +519,15 @@ class TrackCSVReader:
         # Set of unique genres
         self.__dataset_of_genres = set()
 
+    @property
+    def source_files(self) -> list:
+        """ Every album and track csv file read by this reader. """
+        return self.__albums_csv_files + self.__tracks_csv_files
+
+    @property
+    def encoding(self) -> str:
+        return self.__encoding
+
     @property
     def dataset_of_tracks(self) -> list:
         return self.__dataset_of_tracks
@@ -97,74 +544,203 @@ class TrackCSVReader:
     def dataset_of_genres(self) -> set:
         return self.__dataset_of_genres
 
-    def read_albums_file_as_dict(self) -> dict:
-        if not os.path.exists(self.__albums_csv_file):
-            print(f"path {self.__albums_csv_file} does not exist!")
+    @property
+    def album_index(self) -> AlbumIndex:
+        """ The AlbumIndex of the last iter_tracks call in lazy_albums mode, closed once the tracks are read. """
+        return self.__album_index
+
+    @property
+    def registry(self) -> EntityRegistry:
+        return self.__registry
+
+    @property
+    def track_parse_stats(self) -> ParseStats:
+        """ Rows parsed and parse throughput (rows/sec) of the last pass over the tracks csv files. """
+        return self.__track_parse_stats
+
+    @property
+    def shard_stats(self) -> dict:
+        """ Rows parsed and time spent parsing them, for each album and track csv file of the last pass. """
+        return self.__shard_stats
+
+    @property
+    def genre_parse_errors(self) -> list:
+        """ One dict (track_id, value, error) for every track whose track_genres value could not be parsed. """
+        return self.__genre_parser.errors
 
+    def read_albums_file_as_dict(self) -> dict:
         album_dict = dict()
-        # encoding of unicode_escape is required to decode successfully
-        with open(self.__albums_csv_file, encoding="unicode_escape") as album_csv:
-            reader = csv.DictReader(album_csv)
-            for row in reader:
-                album_id = int(
-                    row['album_id']) if row['album_id'].isdigit() else row['album_id']
-                if type(album_id) is not int:
-                    print(f'Invalid album_id: {album_id}')
-                    print(row)
-                    continue
-                album = create_album_object(row)
-                album_dict[album_id] = album
+        for albums_csv_file in self.__albums_csv_files:
+            if not os.path.exists(albums_csv_file):
+                print(f"path {albums_csv_file} does not exist!")
+                continue
+
+            stats = self.__shard_stats[albums_csv_file] = ParseStats()
+            start = time.perf_counter()
+            rows = 0
+            # encoding of unicode_escape is required to decode the source files successfully
+            with open(albums_csv_file, encoding=self.__encoding) as album_csv:
+                reader = csv.DictReader(album_csv)
+                for row in reader:
+                    rows += 1
+                    album_id = int(
+                        row['album_id']) if row['album_id'].isdigit() else row['album_id']
+                    if type(album_id) is not int:
+                        print(f'Invalid album_id: {album_id}')
+                        print(row)
+                        continue
+                    if album_id in album_dict:
+                        # Already read from an earlier shard.
+                        continue
+                    album = create_album_object(row)
+                    album_dict[album_id] = album
+            stats.add(rows, time.perf_counter() - start)
 
         return album_dict
 
     def read_tracks_file(self):
-        if not os.path.exists(self.__tracks_csv_file):
-            print(f"path {self.__tracks_csv_file} does not exist!")
-            return
         track_rows = []
-        # encoding of unicode_escape is required to decode successfully
-        with open(self.__tracks_csv_file, encoding='unicode_escape') as track_csv:
-            reader = csv.DictReader(track_csv)
-            for track_row in reader:
-                track_rows.append(track_row)
+        for tracks_csv_file in self.__tracks_csv_files:
+            if not os.path.exists(tracks_csv_file):
+                print(f"path {tracks_csv_file} does not exist!")
+                continue
+            # encoding of unicode_escape is required to decode the source files successfully
+            with open(tracks_csv_file, encoding=self.__encoding) as track_csv:
+                reader = csv.DictReader(track_csv)
+                for track_row in reader:
+                    track_rows.append(track_row)
+        return track_rows
+
+    def iter_track_rows(self, workers: int = 1, chunk_size: int = CHUNK_SIZE):
+        """ Yields the rows of the tracks csv files one at a time, without keeping them in memory.
+
+        Only the TRACK_COLUMNS used to build the catalog are kept in each row. With more than one worker the files
+        are split into byte ranges that are parsed in a process pool; rows are still yielded in file order.
+        """
+        self.__track_parse_stats = ParseStats()
+        tracks_csv_files = []
+        for csv_file in self.__tracks_csv_files:
+            if not os.path.exists(csv_file):
+                print(f"path {csv_file} does not exist!")
+                continue
+            tracks_csv_files.append(csv_file)
+            self.__shard_stats[csv_file] = ParseStats()
+
+        if workers > 1:
+            yield from self.__iter_track_rows_parallel(tracks_csv_files, workers, chunk_size)
+            return
+
+        for csv_file in tracks_csv_files:
+            stats = self.__shard_stats[csv_file]
+            track_rows = iter_projected_rows(csv_file, TRACK_COLUMNS, self.__encoding)
+            while True:
+                # Only the parsing of each batch is timed, not the time the caller spends on the rows between yields.
+                start = time.perf_counter()
+                batch = list(islice(track_rows, ROW_BATCH_SIZE))
+                stats.add(len(batch), time.perf_counter() - start)
+                if not batch:
+                    break
+                yield from batch
+            self.__track_parse_stats.add(stats.rows, stats.seconds)
+
+    def __iter_track_rows_parallel(self, tracks_csv_files: list, workers: int, chunk_size: int):
+        # The pool's throughput is its elapsed time from splitting the files to the last chunk, leaving out the time
+        # the caller spends on the rows between yields. The workers' own parse times overlap, so they can not be
+        # added up for it.
+        start = time.perf_counter()
+        rows = 0
+        suspended = 0.0
+        chunks = []
+        escaped = self.__encoding == 'unicode_escape'
+        for csv_file in tracks_csv_files:
+            if os.path.getsize(csv_file) == 0:
+                continue
+            with open(csv_file, 'rb') as track_csv, mmap.mmap(track_csv.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                header_end = find_record_end(data, 0, 0, escaped)
+                header = data[:header_end]
+                chunks += [(csv_file, header, start, end, self.__encoding)
+                           for start, end in split_csv_records(data, chunk_size, header_end, escaped)]
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            # Keep a bounded number of chunks in flight, so memory does not grow with the size of the files.
+            pending = deque()
+            remaining_chunks = iter(chunks)
+            while True:
+                for chunk in islice(remaining_chunks, 2 * workers - len(pending)):
+                    pending.append((chunk[0], executor.submit(parse_track_chunk, *chunk)))
+                if not pending:
+                    break
+                track_rows = self.__collect_chunk(*pending.popleft())
+                rows += len(track_rows)
+                yielded = time.perf_counter()
+                yield from track_rows
+                suspended += time.perf_counter() - yielded
+        self.__track_parse_stats.add(rows, time.perf_counter() - start - suspended)
+
+    def __collect_chunk(self, csv_file: str, future):
+        track_rows, seconds = future.result()
+        # Time the worker spent parsing the chunk.
+        self.__shard_stats[csv_file].add(len(track_rows), seconds)
         return track_rows
 
-    def read_csv_files(self):
+    def iter_tracks(self, workers: int = 1, chunk_size: int = CHUNK_SIZE):
+        """ Yields fully wired Track objects (artist, album and genres) one csv row at a time.
+
+        The artist, album and genre datasets are filled in as the rows are consumed, so they are only complete
+        once the generator has been exhausted. Tracks are not kept by the reader. Rows can be parsed by several
+        worker processes, the result is the same as with one.
+        """
+        self.__shard_stats = dict()
         # key is album_id
-        albums_dict: dict = self.read_albums_file_as_dict()
-        # list of track csv rows, not track objects
-        track_rows: list = self.read_tracks_file()
+        if self.__lazy_albums:
+            albums_dict = self.__album_index = AlbumIndex(self.__albums_csv_files, self.__encoding, self.__shard_stats)
+        else:
+            albums_dict: dict = self.read_albums_file_as_dict()
+        self.__genre_parser = GenreParser(self.__registry)
+        track_ids = set()
 
-        # Make sure re-initialize to empty list, so that calling this function multiple times does not create
-        # duplicated dataset.
-        self.__dataset_of_tracks = []
-        for track_row in track_rows:
-            track = create_track_object(track_row)
-            artist = create_artist_object(track_row)
-            track.artist = artist
+        try:
+            for track_row in self.iter_track_rows(workers, chunk_size):
+                track = create_track_object(track_row)
+                if track.track_id in track_ids:
+                    # Already read from an earlier shard.
+                    continue
+                track_ids.add(track.track_id)
 
-            # Extract track_genres attributes and assign genres to the track.
-            track_genres = extract_genres(track_row)
-            for genre in track_genres:
-                track.add_genre(genre)
+                artist = create_artist_object(track_row, self.__registry)
+                track.artist = artist
 
-            album_id = int(
-                track_row['album_id']) if track_row['album_id'].isdigit() else None
+                # Extract track_genres attributes and assign genres to the track.
+                track_genres = extract_genres(track_row, self.__genre_parser)
+                for genre in track_genres:
+                    track.add_genre(genre)
 
-            album = albums_dict[album_id] if album_id in albums_dict else None
-            track.album = album
+                album_id = int(
+                    track_row['album_id']) if track_row['album_id'].isdigit() else None
+
+                album = self.__registry.album(albums_dict[album_id]) if album_id in albums_dict else None
+                track.album = album
+
+                # Populate datasets for Artist and Genre
+                if artist not in self.__dataset_of_artists:
+                    self.__dataset_of_artists.add(artist)
 
-            # Populate datasets for Artist and Genre
-            if artist not in self.__dataset_of_artists:
-                self.__dataset_of_artists.add(artist)
+                if album is not None and album not in self.__dataset_of_albums:
+                    self.__dataset_of_albums.add(album)
 
-            if album is not None and album not in self.__dataset_of_albums:
-                self.__dataset_of_albums.add(album)
+                for genre in track_genres:
+                    if genre not in self.__dataset_of_genres:
+                        self.__dataset_of_genres.add(genre)
 
-            for genre in track_genres:
-                if genre not in self.__dataset_of_genres:
-                    self.__dataset_of_genres.add(genre)
+                yield track
+        finally:
+            # The album maps are released once the tracks are read, the albums they referenced stay in memory.
+            if self.__lazy_albums:
+                albums_dict.close()
 
-            self.__dataset_of_tracks.append(track)
+    def read_csv_files(self, workers: int = 1):
+        # Make sure re-initialize to empty list, so that calling this function multiple times does not create
+        # duplicated dataset.
+        self.__dataset_of_tracks = list(self.iter_tracks(workers))
 
         return self.__dataset_of_tracks
@@ -0,0 +1,54 @@
+from sqlalchemy import create_engine, event
+from sqlalchemy.pool import NullPool, QueuePool
+
+# Defaults of the performance profile: up to 256 MiB of the database file is memory-mapped, and every connection keeps
+# a 64 MiB page cache (PRAGMA cache_size takes KiB when negative).
+SQLITE_MMAP_SIZE = 256 * 1024 * 1024
+SQLITE_CACHE_SIZE = -64 * 1024
+
+
+def performance_pragmas(mmap_size: int = SQLITE_MMAP_SIZE, cache_size: int = SQLITE_CACHE_SIZE) -> tuple:
+    """ Returns the PRAGMA statements of the SQLite performance profile.
+
+    WAL lets requests read while another one writes, and with it synchronous=NORMAL is still safe against
+    corruption, only the last transactions can be lost on a power failure.
+    """
+    return (
+        'PRAGMA journal_mode=WAL',
+        'PRAGMA synchronous=NORMAL',
+        f'PRAGMA mmap_size={int(mmap_size)}',
+        f'PRAGMA cache_size={int(cache_size)}',
+        'PRAGMA temp_store=MEMORY'
+    )
+
+
+def create_database_engine(database_uri: str, echo: bool = False, performance_profile: bool = False,
+                           mmap_size: int = SQLITE_MMAP_SIZE, cache_size: int = SQLITE_CACHE_SIZE,
+                           pool_size: int = 0, pool_timeout: float = 30):
+    """ Returns the engine of the SQLite database at database_uri.
+
+    By default every session opens a new connection with SQLite's default settings (NullPool). With a pool_size,
+    up to that many connections are kept open and reused, and requests wait up to pool_timeout seconds for one.
+    With the performance profile, the pragmas of performance_pragmas are applied to every new connection.
+    """
+    if pool_size > 0:
+        pool_options = {'poolclass': QueuePool, 'pool_size': pool_size, 'max_overflow': 0,
+                        'pool_timeout': pool_timeout}
+    else:
+        pool_options = {'poolclass': NullPool}
+    # Requests and the background catalog load share connections across threads.
+    engine = create_engine(database_uri, connect_args={"check_same_thread": False}, echo=echo, **pool_options)
+
+    if performance_profile:
+        pragmas = performance_pragmas(mmap_size, cache_size)
+
+        @event.listens_for(engine, 'connect')
+        def apply_performance_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            try:
+                for pragma in pragmas:
+                    cursor.execute(pragma)
+            finally:
+                cursor.close()
+
+    return engine
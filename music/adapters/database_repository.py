@@ -1,11 +1,10 @@
 from typing import List
 
-from sqlalchemy import desc, asc, func
+from sqlalchemy import desc, asc, func, select, text
 from sqlalchemy.orm.exc import NoResultFound, MultipleResultsFound
 
 from sqlalchemy.orm import scoped_session
 
-import os
 from pathlib import Path
 
 
@@ -18,7 +17,16 @@ from music.domainmodel.album import Album
 from music.domainmodel.user import User
 
 from music.adapters.repository import  AbstractRepository
-from music.adapters.csvdatareader import TrackCSVReader
+from music.adapters.csvdatareader import TrackCSVReader, find_catalog_files
+from music.adapters.catalog_snapshot import catalog_reader
+from music.adapters.catalog_delta import TRACK_ENTITY, ALBUM_ENTITY, track_row_hash, album_row_hash
+from music.adapters.orm import (
+    artist_table, album_table, tracks_table, genre_table, track_genre_table, catalog_rows_table,
+    playlist_subscribers_table, TRACK_SEARCH_TABLE
+)
+
+# Number of tracks, with their new artists, albums and genres, inserted per transaction by populate_two.
+BULK_BATCH_SIZE = 5000
 
 
 class SessionContextManager:
@@ -45,8 +53,9 @@ class SessionContextManager:
     def reset_session(self):
         # this method can be used e.g. to allow Flask to start a new session for each http request,
         # via the 'before_request' callback
-        self.close_current_session()
-        self.__session = scoped_session(self.__session_factory)
+        # scoped_session keeps a session per thread; remove closes only the session of the calling thread, so requests
+        # served by other threads keep theirs and pooled connections are always returned.
+        self.__session.remove()
 
     def close_current_session(self):
         if not self.__session is None:
@@ -76,10 +85,22 @@ class SqlAlchemyRepository(AbstractRepository):
             pass
         return user
 
+    def get_user_by_id(self, user_id: int) -> User:
+        return self._session_cm.session.query(User).get(user_id)
+
     def get_number_of_users(self) -> int:
         number_of_users = self._session_cm.session.query(User).count()
         return number_of_users
 
+    def _removed_track_ids(self):
+        # Select of the ids of tombstoned tracks.
+        return select(catalog_rows_table.c.entity_id).where(
+            catalog_rows_table.c.entity == TRACK_ENTITY, catalog_rows_table.c.removed == True)
+
+    def _catalog_tracks(self):
+        # Tracks query that leaves out tombstoned tracks.
+        return self._session_cm.session.query(Track).filter(Track._Track__track_id.notin_(self._removed_track_ids()))
+
     def add_track(self, track: Track):
         with self._session_cm as scm:
             scm.session.merge(track)
@@ -96,116 +117,85 @@ class SqlAlchemyRepository(AbstractRepository):
     
     def get_tracks_by_artist(self, target_artist: Artist) -> List[Track]:
         if target_artist is None:
-            tracks = self._session_cm.session.query(Track).all()
+            tracks = self._catalog_tracks().all()
             return tracks
         else:
             # Return tracks matching target_artist; return an empty list if there are no matches.
-            tracks = self._session_cm.session.query(Track).filter(Track._Track__artist == target_artist).all()
+            tracks = self._catalog_tracks().filter(Track._Track__artist == target_artist).all()
             return tracks
     
     def get_number_of_tracks(self) -> int:
-        number_of_tracks = self._session_cm.session.query(Track).count()
+        number_of_tracks = self._catalog_tracks().count()
         return number_of_tracks
 
     def get_all_track_ids(self): 
-        track_ids = self._session_cm.session.query(Track).all()
-        return [track.track_id for track in track_ids]
+        query = select(tracks_table.c.track_id).where(tracks_table.c.track_id.notin_(self._removed_track_ids())) \
+            .order_by(tracks_table.c.track_id)
+        return self._session_cm.session.execute(query).scalars().all()
 
     def get_tracks_by_id(self, id_list):
         tracks = self._session_cm.session.query(Track).filter(Track._Track__track_id.in_(id_list)).all()
         return tracks
     
-    def get_track_ids_for_titles(self, key: str):
-        # Get first occurrence of artist with artist_name.
-        check_title = self._session_cm.session.query(Track).filter(Track._Track__title.ilike("%"+key+"%")).first()
-
-        if check_title is not None:
-            track_ids = list()
-            tracks = self._session_cm.session.query(Track).all()
-            for track in tracks:
-                if (track.title).lower().find(key.lower()) != -1:
-                    track_ids.append(track.track_id)
+    def _track_search_is_fulltext(self) -> bool:
+        # track_search is a plain table when the database was created by a SQLite without the trigram tokenizer.
+        sql = self._session_cm.session.execute(text("SELECT sql FROM sqlite_master WHERE name = :name"),
+                                               {'name': TRACK_SEARCH_TABLE}).scalar()
+        return sql is not None and 'fts5' in sql.lower()
+
+    def _search_track_ids(self, column: str, key: str):
+        """ Returns the ids of the catalog tracks whose column of the track_search index contains key, ignoring case. """
+        if len(key) >= 3 and self._track_search_is_fulltext():
+            # Matched as a single phrase, which the trigram index finds anywhere in the column.
+            phrase = key.replace('"', '""')
+            condition, parameter = 'track_search MATCH :key', f'{{{column}}} : "{phrase}"'
         else:
-            # No Artist with name artist_name, so return an empty list.
-            track_ids = list()
-        
-        return track_ids
+            # Shorter keys have no trigram to look up, and without the trigram index there is none to look them up
+            # in, so the column is scanned, still without loading any tracks.
+            condition, parameter = f'instr(lower({column}), lower(:key)) > 0', key
+        rows = self._session_cm.session.execute(text(
+            f"SELECT rowid FROM {TRACK_SEARCH_TABLE} WHERE {condition} AND rowid NOT IN "
+            f"(SELECT entity_id FROM catalog_rows WHERE entity = :entity AND removed) ORDER BY rowid"),
+            {'key': parameter, 'entity': TRACK_ENTITY})
+        return [row[0] for row in rows]
+
+    def get_track_ids_for_titles(self, key: str):
+        return self._search_track_ids('title', key)
 
     def get_track_ids_for_artist(self, artist_name: str):
-        # Get first occurrence of artist with artist_name.
-        check_artist = self._session_cm.session.query(Artist).filter(Artist._Artist__full_name.ilike("%"+artist_name+"%")).first()
-
-        if check_artist is not None:
-            track_ids = list()
-            tracks = self._session_cm.session.query(Track).all()
-            for track in tracks:
-                if track.artist:
-                    if (track.artist.full_name).lower().find(artist_name.lower()) != -1:
-                        track_ids.append(track.track_id)
-        else:
-            # No Artist with name artist_name, so return an empty list.
-            track_ids = list()
-        
-        return track_ids
-    
+        return self._search_track_ids('artist', artist_name)
+
     def get_track_ids_for_genre(self, genre_name: str):
-        # Get first occurrence of genre with genre_name.
-        try: 
-            check_genre = self._session_cm.session.query(Genre).filter(func.lower(Genre._Genre__name) == func.lower(genre_name)).one()
-        except NoResultFound: check_genre = None
-
-
-        if check_genre is not None:
-            track_ids = list()
-            tracks = self._session_cm.session.query(Track).all()
-            for track in tracks:
-                for genre in track.genres:
-                    if (genre.name).lower() == genre_name.lower():
-                        track_ids.append(track.track_id)
-        else:
-            # No Genre with name genre_name, so return an empty list.
-            track_ids = list()
-        
-        return track_ids
+        # Ids of the catalog tracks with a genre named genre_name, ignoring case, without loading any tracks.
+        query = select(track_genre_table.c.track_id).distinct() \
+            .join(genre_table, genre_table.c.genre_id == track_genre_table.c.genre_id) \
+            .where(func.lower(genre_table.c.genre) == func.lower(genre_name),
+                   track_genre_table.c.track_id.notin_(self._removed_track_ids())) \
+            .order_by(track_genre_table.c.track_id)
+        return self._session_cm.session.execute(query).scalars().all()
     
     def get_track_ids_for_album(self, album_name: str):
-        # Get first occurrence of album with album_name.
-        check_album = self._session_cm.session.query(Album).filter(Album._Album__title.ilike("%"+album_name+"%")).first()
-        
-        if check_album is not None:
-            track_ids = list()
-            tracks = self._session_cm.session.query(Track).all()
-            for track in tracks:
-                if track.album:
-                    if (track.album.title).lower().find(album_name.lower()) != -1:
-                        track_ids.append(track.track_id)
-        else:
-            # No Album with name album_name, so return an empty list.
-            track_ids = list()
-        
-        return track_ids
+        return self._search_track_ids('album', album_name)
 
     def get_tracks_by_genre(self, target_genre: Genre) -> List[Track]:
         if target_genre is None:
-            tracks = self._session_cm.session.query(Track).all()
+            tracks = self._catalog_tracks().all()
             return tracks
         else:
             # Return tracks matching target_genre; return an empty list if there are no matches.
-            tracks_with_genre = []
-            tracks = self._session_cm.session.query(Track).all()
-            for track in tracks:
-                for genre in track.genres:
-                    if genre == target_genre:
-                        tracks_with_genre.append(track)
-            return tracks_with_genre
+            track_ids = select(track_genre_table.c.track_id).where(
+                track_genre_table.c.genre_id == target_genre.genre_id)
+            tracks = self._catalog_tracks().filter(Track._Track__track_id.in_(track_ids)) \
+                .order_by(Track._Track__track_id).all()
+            return tracks
     
     def get_tracks_by_album(self, target_album: Album) -> List[Track]:
         if target_album is None:
-            tracks = self._session_cm.session.query(Track).all()
+            tracks = self._catalog_tracks().all()
             return tracks
         else:
             # Return tracks matching target_album; return an empty list if there are no matches.
-            tracks = self._session_cm.session.query(Track).filter(Track._Track__album == target_album).all()
+            tracks = self._catalog_tracks().filter(Track._Track__album == target_album).all()
             return tracks
 
     def add_genre(self, genre: Genre):
@@ -236,7 +226,7 @@ class SqlAlchemyRepository(AbstractRepository):
         return albums
     
     def get_tracks(self) -> List[Track]:
-        tracks = self._session_cm.session.query(Track).all()
+        tracks = self._catalog_tracks().all()
         return tracks
     
     def add_review(self, track, review):
@@ -263,6 +253,19 @@ class SqlAlchemyRepository(AbstractRepository):
     def get_all_reviews(self): 
         reviews = self._session_cm.session.query(Review).all()
         return reviews
+
+    def _reviews_query(self, track: Track = None):
+        query = self._session_cm.session.query(Review)
+        if track is not None:
+            query = query.filter(Review._Review__track == track)
+        return query
+
+    def get_reviews_page(self, cursor: int, page_size: int, track: Track = None) -> List[Review]:
+        # review_id grows with every review written, so the page is read in that order straight from the index.
+        return self._reviews_query(track).order_by(asc('review_id')).offset(cursor).limit(page_size).all()
+
+    def get_number_of_reviews(self, track: Track = None) -> int:
+        return self._reviews_query(track).count()
     
     def get_all_liked_tracks(self, user: User):
         return user.liked_tracks
@@ -275,11 +278,31 @@ class SqlAlchemyRepository(AbstractRepository):
     def remove_playlist_from_lists(self, user, playlist: PlayList): 
         with self._session_cm as scm:
             user.remove_playlist(playlist)
+            scm.session.execute(playlist_subscribers_table.delete().where(
+                playlist_subscribers_table.c.list_id == playlist.list_id))
             scm.session.query(PlayList).filter(PlayList._PlayList__list_id == playlist.list_id).delete()
             scm.session.commit()
+
+    def subscribe_to_playlist(self, user: User, playlist: PlayList):
+        if not isinstance(playlist, PlayList): return
+        # The creator already has the playlist and is not counted as a subscriber, like in the memory repository.
+        if playlist.user == user: return
+        # The playlist keeps its creator, the subscription is a row of its own.
+        with self._session_cm as scm:
+            scm.session.execute(playlist_subscribers_table.insert().prefix_with('OR IGNORE'),
+                                {'list_id': playlist.list_id, 'user_id': user.user_id})
+            scm.commit()
+
+    def get_number_of_subscribers(self, playlist: PlayList) -> int:
+        return self._session_cm.session.execute(
+            select(func.count()).select_from(playlist_subscribers_table).where(
+                playlist_subscribers_table.c.list_id == playlist.list_id)).scalar()
     
     def get_user_playlists(self, user):
-        playlists = self._session_cm.session.query(PlayList).filter(PlayList._PlayList__user == user).all()
+        subscribed_playlist_ids = select(playlist_subscribers_table.c.list_id).where(
+            playlist_subscribers_table.c.user_id == user.user_id)
+        playlists = self._session_cm.session.query(PlayList).filter(
+            (PlayList._PlayList__user == user) | PlayList._PlayList__list_id.in_(subscribed_playlist_ids)).all()
         return playlists
 
     def get_playlist_id(self):
@@ -319,23 +342,104 @@ class SqlAlchemyRepository(AbstractRepository):
             playlist.switch_visibility()
             scm.session.commit()
         print(playlist.is_public)
-        
-def populate_two(data_path: Path, repo: SqlAlchemyRepository, database_mode=False):
-    """ Populates the given repository using data at the given path. """
-    dirname = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-    albums_file_name = os.path.join(dirname, 'adapters/data/raw_albums_excerpt.csv')
-    tracks_file_name = os.path.join(dirname, 'adapters/data/raw_tracks_excerpt.csv')
-    reader = TrackCSVReader(albums_file_name, tracks_file_name, database_mode)
-    reader.read_csv_files()
-
-    for artist in reader.dataset_of_artists:
-        repo.add_artist(artist)
-
-    for genre in reader.dataset_of_genres:
-        repo.add_genre(genre)
-    
-    for album in reader.dataset_of_albums:
-        repo.add_album(album)
-    
-    for track in reader.dataset_of_tracks:
-        repo.add_track(track)
\ No newline at end of file
+
+    def get_catalog_row_hashes(self, entity: str) -> dict:
+        rows = self._session_cm.session.execute(
+            select(catalog_rows_table.c.entity_id, catalog_rows_table.c.row_hash).where(
+                catalog_rows_table.c.entity == entity, catalog_rows_table.c.removed == False))
+        return {entity_id: row_hash for entity_id, row_hash in rows}
+
+    def bulk_add(self, rows_by_table: list):
+        """ Inserts (table, rows) pairs, rows being dicts of column values, with one executemany per table.
+
+        Everything is inserted in a single transaction, in the order given, bypassing the ORM session.
+        """
+        with self._session_cm as scm:
+            for table, rows in rows_by_table:
+                if rows:
+                    scm.session.execute(table.insert(), rows)
+            scm.commit()
+
+    def upsert_album(self, album: Album, row_hash: str):
+        with self._session_cm as scm:
+            scm.session.merge(album)
+            scm.session.execute(catalog_rows_table.insert().prefix_with('OR REPLACE'),
+                                {'entity': ALBUM_ENTITY, 'entity_id': album.album_id, 'row_hash': row_hash,
+                                 'removed': False})
+            scm.commit()
+
+    def upsert_track(self, track: Track, row_hash: str):
+        with self._session_cm as scm:
+            # merge cascades to the artist, album and genres of the track, inserting or updating them too.
+            scm.session.merge(track)
+            scm.session.execute(catalog_rows_table.insert().prefix_with('OR REPLACE'),
+                                {'entity': TRACK_ENTITY, 'entity_id': track.track_id, 'row_hash': row_hash,
+                                 'removed': False})
+            scm.commit()
+
+    def remove_tracks(self, track_ids):
+        track_ids = list(track_ids)
+        with self._session_cm as scm:
+            # In batches, to stay below the SQLite limit on bound parameters.
+            for start in range(0, len(track_ids), 500):
+                scm.session.execute(catalog_rows_table.update().where(
+                    catalog_rows_table.c.entity == TRACK_ENTITY,
+                    catalog_rows_table.c.entity_id.in_(track_ids[start:start + 500])).values(removed=True))
+            scm.commit()
+
+def populate_two(data_path: Path, repo: SqlAlchemyRepository, database_mode=False, workers: int = 1,
+                 cache_dir: str = None) -> TrackCSVReader:
+    """ Populates the given repository using data at the given path. Returns the reader, for its parse stats.
+
+    data_path is a catalog folder, or a glob of folders, holding one or more album and track csv shards. With more
+    than one worker the track shards are parsed by a pool of processes. With a cache_dir the csv files are read
+    from UTF-8 copies kept there.
+    """
+    albums_file_names, tracks_file_names = find_catalog_files(data_path)
+    if not tracks_file_names:
+        print(f"no track csv files found at {data_path}")
+    reader = catalog_reader(albums_file_names, tracks_file_names, database_mode, cache_dir)
+
+    # Tracks are streamed from the reader and inserted in batches. Artists, genres and albums are inserted in the
+    # same batch as the first track that refers to them, ahead of the tracks.
+    artists, genres, albums = set(), set(), set()
+    batch = new_bulk_batch()
+    for track in reader.iter_tracks(workers):
+        if track.artist not in artists:
+            artists.add(track.artist)
+            batch[artist_table].append({'artist_id': track.artist.artist_id, 'full_name': track.artist.full_name})
+
+        for genre in track.genres:
+            if genre not in genres:
+                genres.add(genre)
+                batch[genre_table].append({'genre_id': genre.genre_id, 'genre': genre.name})
+            batch[track_genre_table].append({'track_id': track.track_id, 'genre_id': genre.genre_id})
+
+        album = track.album
+        if album is not None and album not in albums:
+            albums.add(album)
+            batch[album_table].append({'album_id': album.album_id, 'title': album.title, 'album_url': album.album_url,
+                                       'album_type': album.album_type, 'release_year': album.release_year})
+            # Stored for refresh_catalog, which only rewrites the rows whose hash changes.
+            batch[catalog_rows_table].append({'entity': ALBUM_ENTITY, 'entity_id': album.album_id,
+                                              'row_hash': album_row_hash(album), 'removed': False})
+
+        batch[tracks_table].append({'track_id': track.track_id, 'title': track.title,
+                                    'artist_id': track.artist.artist_id if track.artist is not None else None,
+                                    'album_id': album.album_id if album is not None else None,
+                                    'tracks_url': track.track_url, 'track_duration': track.track_duration})
+        batch[catalog_rows_table].append({'entity': TRACK_ENTITY, 'entity_id': track.track_id,
+                                          'row_hash': track_row_hash(track), 'removed': False})
+
+        if len(batch[tracks_table]) >= BULK_BATCH_SIZE:
+            repo.bulk_add(list(batch.items()))
+            batch = new_bulk_batch()
+
+    repo.bulk_add(list(batch.items()))
+    return reader
+
+
+def new_bulk_batch() -> dict:
+    # Tables in insert order, referenced rows before the rows that refer to them.
+    return {table: [] for table in (artist_table, genre_table, album_table, tracks_table, track_genre_table,
+                                    catalog_rows_table)}
@@ -1,10 +1,11 @@
 import csv
-import os
 from pathlib import Path
 import re
 from typing import List
 
 from bisect import bisect, bisect_left, insort_left
+from collections import defaultdict
+from operator import attrgetter
 
 from werkzeug.security import generate_password_hash
 
@@ -16,7 +17,10 @@ from music.domainmodel.genre import Genre
 from music.domainmodel.review import Review
 from music.domainmodel.album import Album
 from music.domainmodel.user import User
-from music.adapters.csvdatareader import TrackCSVReader
+from music.adapters.csvdatareader import find_catalog_files
+from music.adapters.catalog_snapshot import catalog_reader, read_catalog
+from music.adapters.catalog_delta import TRACK_ENTITY, ALBUM_ENTITY, track_row_hash, album_row_hash
+from music.adapters.text_index import NGramIndex
 
 class MemoryRepository(AbstractRepository):
     # Tracks ordered by id which is assumed unique.
@@ -24,20 +28,50 @@ class MemoryRepository(AbstractRepository):
     def __init__(self):
         self.__tracks = list()
         self.__tracks_index = dict()
+        # Tombstoned tracks, by id. They are no longer in the catalog but users may still refer to them.
+        self.__removed_tracks = dict()
+        # Titles of the tracks in the catalog, for substring search. The index reads the titles from the tracks.
+        self.__titles_index = NGramIndex(lambda track_id: self.__tracks_index[track_id].title)
+        # Tracks of every artist, album and genre id, ordered like self.__tracks. Tracks without an artist or album
+        # are kept under None.
+        self.__tracks_by_artist = defaultdict(list)
+        self.__tracks_by_album = defaultdict(list)
+        self.__tracks_by_genre = defaultdict(list)
         self.__artists = list()
+        self.__artists_index = dict()
         self.__genres = list()
+        self.__genres_index = dict()
         self.__albums = list()
+        self.__albums_index = dict()
         self.__reviews = dict()
         self.__users = list()
+        # The first user added under every user name and id, looked up on nearly every request.
+        self.__users_by_name = dict()
+        self.__users_by_id = dict()
+        # Every review in the order it was added, which is the order it was written in, and the keys of the reviews
+        # in it, so a review submitted twice is found without comparing it to all of them.
         self.__reviews_list = list()
-        self.__playlist_list = []
+        self.__review_keys = set()
+        # Playlists by list_id, in the order they were added, and the position each one was added at.
+        self.__playlists = dict()
+        self.__playlist_positions = dict()
+        self.__playlists_added = 0
+        # The public ones, by list_id, in the order they were added too.
+        self.__public_playlists = dict()
+        # Users that have each playlist in their playlists, its creator included, by list_id.
+        self.__playlist_subscribers = dict()
         self.__playlist_ids = 0
     
     def add_user(self, user: User):
         self.__users.append(user)
+        self.__users_by_name.setdefault(user.user_name, user)
+        self.__users_by_id.setdefault(user.user_id, user)
 
     def get_user(self, user_name) -> User:
-        return next((user for user in self.__users if user.user_name == user_name), None)
+        return self.__users_by_name.get(user_name)
+
+    def get_user_by_id(self, user_id: int) -> User:
+        return self.__users_by_id.get(user_id)
 
     def get_number_of_users(self) -> int:
         return len(self.__users)
@@ -45,29 +79,56 @@ class MemoryRepository(AbstractRepository):
     def add_track(self, track: Track):
         insort_left(self.__tracks, track)
         self.__tracks_index[track.track_id] = track
+        self.__titles_index.add(track.track_id, track.title)
+        for bucket in self.__track_buckets(track):
+            insort_left(bucket, track)
         self.__reviews[track] = []
+
+    def add_tracks(self, tracks):
+        # Adding the tracks one by one shifts the sorted list on every insert, instead sort once after all of them
+        # are appended. The sort is stable, so ties keep the tracks that were added first in front.
+        new_tracks = list(tracks)
+        changed_buckets = dict()
+        for track in new_tracks:
+            self.__tracks_index[track.track_id] = track
+            for bucket in self.__track_buckets(track):
+                bucket.append(track)
+                changed_buckets[id(bucket)] = bucket
+            self.__reviews[track] = []
+        self.__titles_index.add_many((track.track_id, track.title) for track in new_tracks)
+        self.__tracks.extend(new_tracks)
+        self.__tracks.sort(key=attrgetter('track_id'))
+        for bucket in changed_buckets.values():
+            bucket.sort(key=attrgetter('track_id'))
+
+    def __track_buckets(self, track: Track) -> list:
+        # The lists of self.__tracks_by_artist, _album and _genre the track belongs in.
+        buckets = [self.__tracks_by_artist[track.artist.artist_id if track.artist is not None else None],
+                   self.__tracks_by_album[track.album.album_id if track.album is not None else None]]
+        buckets.extend(self.__tracks_by_genre[genre.genre_id] for genre in track.genres)
+        return buckets
+
+    def __unindex_track(self, track: Track):
+        # Takes the track out of the artist, album and genre lists, e.g. before they change.
+        for bucket in self.__track_buckets(track):
+            del bucket[bisect_left(bucket, track)]
     
     def get_track(self, id: int) -> Track:
         track = None
         try:
             track = self.__tracks_index[id]
         except KeyError:
-            raise ValueError(f"no track with the id '{id}'")
+            if id not in self.__removed_tracks:
+                raise ValueError(f"no track with the id '{id}'")
+            track = self.__removed_tracks[id]
             
         return track
     
     def get_tracks_by_artist(self, target_artist: Artist) -> List[Track]:
-        matching_tracks = list()
-
-        try:
-            for track in self.__tracks:
-                if track.artist == target_artist:
-                    matching_tracks.append(track)
-        except ValueError:
-            # No tracks for specified artist. Simply return an empty list.
-            pass
-
-        return matching_tracks
+        # Tracks without an artist are found with None, like they were when comparing every track's artist.
+        if target_artist is not None and not isinstance(target_artist, Artist):
+            return []
+        return list(self.__tracks_by_artist.get(target_artist.artist_id if target_artist is not None else None, ()))
     
     def get_number_of_tracks(self) -> int:
         return len(self.__tracks)
@@ -85,20 +146,8 @@ class MemoryRepository(AbstractRepository):
         return tracks
     
     def get_track_ids_for_titles(self, key: str):
-        # Linear search, to find the first occurence of an artist with the name artist_name.
-        check_track = next((c_track for c_track in self.__tracks if c_track.title.lower().find(key.lower()) != -1), None)
-        # Retrieve the ids of tracks associated with the artist.
-        if check_track is not None:
-            track_ids = list()
-            for track in self.__tracks:
-                title = (track.title).lower()
-                if title.find(key.lower()) != -1:
-                    track_ids.append(track.track_id)
-        else:
-            # No artist with name artist_name, so return an empty list.
-            track_ids = list()
-        
-        return track_ids
+        # Looked up in the trigram index of the titles, so only titles sharing the trigrams of key are compared.
+        return self.__titles_index.search(key)
 
     def get_track_ids_for_artist(self, artist_name: str):
         # Linear search, to find the first occurence of an artist with the name artist_name.
@@ -117,21 +166,15 @@ class MemoryRepository(AbstractRepository):
         return track_ids
     
     def get_track_ids_for_genre(self, genre_name: str):
-        # Linear search, to find the first occurence of a Genre with the name genre_name.
-        genre = next((genre for genre in self.__genres if (genre.name).lower() == genre_name.lower()), None)
-
-        # Retrieve the ids of tracks associated with the Genre.
-        if genre is not None:
-            track_ids = list()
-            for track in self.__tracks:
-                for genre in track.genres:
-                    if (genre.name).lower() == genre_name.lower():
-                        track_ids.append(track.track_id)
-        else:
-            # No Genre with name genre_name, so return an empty list.
-            track_ids = list()
-        
-        return track_ids
+        # Only the genres are scanned for the name, their tracks come from the genre index.
+        genre_ids = {genre.genre_id for genre in self.__genres if (genre.name).lower() == genre_name.lower()}
+        if len(genre_ids) == 1:
+            return [track.track_id for track in self.__tracks_by_genre.get(genre_ids.pop(), ())]
+        # Tracks can have more than one genre of the name.
+        tracks = set()
+        for genre_id in genre_ids:
+            tracks.update(self.__tracks_by_genre.get(genre_id, ()))
+        return sorted(track.track_id for track in tracks)
     
     def get_track_ids_for_album(self, album_name: str):
         # Linear search, to find the first occurence of an Album with the name album_name.
@@ -153,46 +196,33 @@ class MemoryRepository(AbstractRepository):
         return track_ids
 
     def get_tracks_by_genre(self, target_genre: Genre) -> List[Track]:
-        matching_tracks = list()
-
-        try:
-            for track in self.__tracks:
-                for genre in track.genres:
-                    if genre == target_genre:
-                        matching_tracks.append(track)
-        except ValueError:
-            # No tracks for specified genre. Simply return an empty list.
-            pass
-
-        return matching_tracks
+        if not isinstance(target_genre, Genre):
+            return []
+        return list(self.__tracks_by_genre.get(target_genre.genre_id, ()))
     
     def get_tracks_by_album(self, target_album: Album) -> List[Track]:
-        matching_tracks = list()
-
-        try:
-            for track in self.__tracks:
-                if track.album == target_album:
-                        matching_tracks.append(track)
-        except ValueError:
-            # No tracks for specified album. Simply return an empty list.
-            pass
-
-        return matching_tracks
+        # Tracks without an album are found with None, like they were when comparing every track's album.
+        if target_album is not None and not isinstance(target_album, Album):
+            return []
+        return list(self.__tracks_by_album.get(target_album.album_id if target_album is not None else None, ()))
 
     def add_genre(self, genre: Genre):
         self.__genres.append(genre)
+        self.__genres_index.setdefault(genre.genre_id, genre)
     
     def get_genres(self) -> List[Genre]:
         return self.__genres
     
     def add_artist(self, artist: Artist):
         self.__artists.append(artist)
+        self.__artists_index.setdefault(artist.artist_id, artist)
     
     def get_artists(self) -> List[Artist]:
         return self.__artists
     
     def add_album(self, album: Album):
         self.__albums.append(album)
+        self.__albums_index.setdefault(album.album_id, album)
     
     def get_albums(self) -> List[Album]:
         return self.__albums
@@ -202,12 +232,20 @@ class MemoryRepository(AbstractRepository):
     
     def add_review(self, track, review):
         if not isinstance(review, Review): return
-        if review in self.__reviews_list:
+        key = self.__review_key(review)
+        if key in self.__review_keys:
             return
 
         self.__reviews[track].append(review)
         
         self.__reviews_list.append(review)
+        self.__review_keys.add(key)
+
+    @staticmethod
+    def __review_key(review: Review) -> tuple:
+        # Review is not hashable, its key holds what Review.__eq__ compares.
+        track_id = review.track.track_id if review.track is not None else None
+        return track_id, review.review_text, review.rating, review.timestamp
 
     def get_reviews(self, track):
         try:
@@ -224,6 +262,13 @@ class MemoryRepository(AbstractRepository):
 
     def get_all_reviews(self): 
         return self.__reviews_list 
+
+    def get_reviews_page(self, cursor: int, page_size: int, track: Track = None) -> List[Review]:
+        reviews = self.__reviews_list if track is None else self.__reviews.get(track, [])
+        return reviews[cursor:cursor + page_size]
+
+    def get_number_of_reviews(self, track: Track = None) -> int:
+        return len(self.__reviews_list if track is None else self.__reviews.get(track, []))
     
     def get_all_liked_tracks(self, user):
         return user.liked_tracks
@@ -231,15 +276,33 @@ class MemoryRepository(AbstractRepository):
     def add_playlist_to_lists(self, user: User, playlist: PlayList): 
         if isinstance(playlist, PlayList):
             user.add_playlist(playlist)
-            if playlist not in self.__playlist_list:
-                self.__playlist_list.append(playlist)
+            self.__playlist_subscribers.setdefault(playlist.list_id, set()).add(user)
+            if playlist.list_id not in self.__playlists:
+                self.__playlists[playlist.list_id] = playlist
+                self.__playlists_added += 1
+                self.__playlist_positions[playlist.list_id] = self.__playlists_added
+                if playlist.is_public:
+                    self.__add_public_playlist(playlist)
     
     def remove_playlist_from_lists(self, user, playlist: PlayList): 
         if isinstance(playlist, PlayList):
-            for user in self.__users: 
-                if playlist in user.playlist: user.remove_playlist(playlist)
-            self.__playlist_list.remove(playlist)
+            # Only the users that have the playlist are touched.
+            user.remove_playlist(playlist)
+            for subscriber in self.__playlist_subscribers.pop(playlist.list_id, ()):
+                subscriber.remove_playlist(playlist)
+            self.__playlists.pop(playlist.list_id, None)
+            self.__playlist_positions.pop(playlist.list_id, None)
+            self.__public_playlists.pop(playlist.list_id, None)
     
+    def subscribe_to_playlist(self, user: User, playlist: PlayList):
+        if isinstance(playlist, PlayList):
+            user.add_playlist(playlist)
+            self.__playlist_subscribers.setdefault(playlist.list_id, set()).add(user)
+
+    def get_number_of_subscribers(self, playlist: PlayList) -> int:
+        subscribers = self.__playlist_subscribers.get(playlist.list_id, ())
+        return len(subscribers) - (1 if playlist.user in subscribers else 0)
+
     def get_user_playlists(self, user):
         return user.playlist
 
@@ -248,17 +311,16 @@ class MemoryRepository(AbstractRepository):
         return self.__playlist_ids
     
     def get_all_playlist(self): 
-        return self.__playlist_list
+        return list(self.__playlists.values())
     
     def get_playlist_by_id(self, id: int): 
-        playlist = next((playlist for playlist in self.__playlist_list if playlist.list_id == id), None)
-        return playlist
+        return self.__playlists.get(id)
     
     def get_user_reviews(self, user): 
         return user.reviews
     
     def get_visible_playlists(self): 
-        return [playlist for playlist in self.__playlist_list if playlist.is_public == True]
+        return list(self.__public_playlists.values())
 
     def add_track_to_playlist(self, track: Track, playlist: PlayList):
         return playlist.add_track(track)
@@ -268,28 +330,146 @@ class MemoryRepository(AbstractRepository):
     
     def change_vis_of_playlist(self, playlist: PlayList):
         playlist.switch_visibility()
+        if playlist.list_id not in self.__playlists:
+            return
+        if playlist.is_public:
+            self.__add_public_playlist(playlist)
+        else:
+            self.__public_playlists.pop(playlist.list_id, None)
+
+    def __add_public_playlist(self, playlist: PlayList):
+        position = self.__playlist_positions[playlist.list_id]
+        newest = next(reversed(self.__public_playlists), None)
+        self.__public_playlists[playlist.list_id] = playlist
+        if newest is not None and self.__playlist_positions[newest] > position:
+            # An older playlist made public again, it is put back among the others in the order they were added.
+            self.__public_playlists = dict(sorted(self.__public_playlists.items(),
+                                                  key=lambda item: self.__playlist_positions[item[0]]))
+
+    def get_catalog_row_hashes(self, entity: str) -> dict:
+        # The stored objects are the catalog rows, so their hashes are computed instead of kept.
+        if entity == TRACK_ENTITY:
+            return {track.track_id: track_row_hash(track) for track in self.__tracks}
+        if entity == ALBUM_ENTITY:
+            return {album.album_id: album_row_hash(album) for album in self.__albums}
+        raise ValueError(f"no catalog entity '{entity}'")
+
+    def upsert_album(self, album: Album, row_hash: str):
+        stored_album = self.__albums_index.get(album.album_id)
+        if stored_album is None:
+            self.add_album(album)
+            return
 
-def populate(data_path: Path, repo: MemoryRepository, database_mode=False):
-    """ Populates the given repository using data at the given path. """
-    dirname = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-    albums_file_name = os.path.join(dirname, 'adapters/data/raw_albums_excerpt.csv')
-    tracks_file_name = os.path.join(dirname, 'adapters/data/raw_tracks_excerpt.csv')
-    reader = TrackCSVReader(albums_file_name, tracks_file_name, database_mode)
-    reader.read_csv_files()
-
-    for track in reader.dataset_of_tracks:
-        repo.add_track(track)
+        stored_album.title = album.title
+        stored_album.album_url = album.album_url
+        stored_album.album_type = album.album_type
+        stored_album.release_year = album.release_year
+
+    def upsert_track(self, track: Track, row_hash: str):
+        # Point the track at the stored artist, album and genres, so they stay shared between tracks.
+        artist = self.__artists_index.get(track.artist.artist_id)
+        if artist is None:
+            artist = track.artist
+            self.add_artist(artist)
+        artist.full_name = track.artist.full_name
+
+        album = None
+        if track.album is not None:
+            album = self.__albums_index.get(track.album.album_id)
+            if album is None:
+                album = track.album
+                self.add_album(album)
+
+        genres = list()
+        for genre in track.genres:
+            stored_genre = self.__genres_index.get(genre.genre_id)
+            if stored_genre is None:
+                stored_genre = genre
+                self.add_genre(stored_genre)
+            stored_genre.name = genre.name
+            genres.append(stored_genre)
+
+        stored_track = self.__tracks_index.get(track.track_id)
+        if stored_track is not None:
+            # Its artist, album and genres may change, it is indexed again once they are updated.
+            self.__unindex_track(stored_track)
+        elif track.track_id in self.__removed_tracks:
+            stored_track = self.__removed_tracks.pop(track.track_id)
+            insort_left(self.__tracks, stored_track)
+            self.__tracks_index[stored_track.track_id] = stored_track
+
+        if stored_track is None:
+            track.artist = artist
+            track.album = album
+            track.genres.clear()
+            for genre in genres:
+                track.add_genre(genre)
+            self.add_track(track)
+            return
 
-    for artist in reader.dataset_of_artists:
+        # Update the stored track in place, users' likes, playlists and reviews refer to that instance.
+        self.__titles_index.remove(stored_track.track_id, stored_track.title)
+        stored_track.title = track.title
+        self.__titles_index.add(stored_track.track_id, stored_track.title)
+        stored_track.track_url = track.track_url
+        try:
+            stored_track.track_duration = track.track_duration
+        except ValueError:
+            # A duration cleared in the csv file, the setter has stored None before rejecting it.
+            pass
+        stored_track.artist = artist
+        stored_track.album = album
+        stored_track.genres.clear()
+        for genre in genres:
+            stored_track.add_genre(genre)
+        for bucket in self.__track_buckets(stored_track):
+            insort_left(bucket, stored_track)
+
+    def remove_tracks(self, track_ids):
+        for track_id in track_ids:
+            track = self.__tracks_index.pop(track_id, None)
+            if track is None:
+                continue
+            del self.__tracks[bisect_left(self.__tracks, track)]
+            self.__titles_index.remove(track_id, track.title)
+            self.__unindex_track(track)
+            self.__removed_tracks[track_id] = track
+
+def populate(data_path: Path, repo: MemoryRepository, database_mode=False, workers: int = 1, cache_dir: str = None):
+    """ Populates the given repository using data at the given path. Returns the reader, for its parse stats.
+
+    data_path is a catalog folder, or a glob of folders, holding one or more album and track csv shards. With more
+    than one worker the track shards are parsed by a pool of processes. With a cache_dir the parsed catalog is
+    loaded from (or saved to) a snapshot there, which is rebuilt from UTF-8 copies of the csv files whenever they
+    change.
+    """
+    albums_file_names, tracks_file_names = find_catalog_files(data_path)
+    if not tracks_file_names:
+        print(f"no track csv files found at {data_path}")
+    reader = catalog_reader(albums_file_names, tracks_file_names, database_mode, cache_dir)
+
+    if cache_dir:
+        catalog = read_catalog(reader, albums_file_names + tracks_file_names, cache_dir, workers)
+        tracks = catalog.dataset_of_tracks
+    else:
+        # Stream the tracks straight into the repository, the artist, genre and album datasets are complete once
+        # every track has been consumed.
+        catalog = reader
+        tracks = reader.iter_tracks(workers)
+
+    repo.add_tracks(tracks)
+
+    for artist in catalog.dataset_of_artists:
         repo.add_artist(artist)
 
-    for genre in reader.dataset_of_genres:
+    for genre in catalog.dataset_of_genres:
         repo.add_genre(genre)
     
-    for album in reader.dataset_of_albums:
+    for album in catalog.dataset_of_albums:
         repo.add_album(album)
     
-    #repo.add_tracks(reader.dataset_of_tracks)
     #repo.add_artists(reader.dataset_of_artists)
     #repo.add_genres(reader.dataset_of_genres)
-    #repo.add_albums(reader.dataset_of_albums)
\ No newline at end of file
+    #repo.add_albums(reader.dataset_of_albums)
+
+    return catalog
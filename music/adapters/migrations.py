@@ -0,0 +1,79 @@
+from sqlalchemy import text
+
+from music.adapters.orm import TRACK_SEARCH_DDL
+
+# Schema migrations of an existing database, in order. The version of the last one applied is kept in the
+# database's PRAGMA user_version, so every migration runs once. A migration must never be changed once released,
+# add a new one instead. New databases get the same schema from orm.py through metadata.create_all.
+MIGRATIONS = (
+    (1, 'Index the foreign keys used by the per-track and per-user lookups', (
+        'CREATE INDEX IF NOT EXISTS ix_tracks_artist_id ON tracks (artist_id)',
+        'CREATE INDEX IF NOT EXISTS ix_tracks_album_id ON tracks (album_id)',
+        'CREATE INDEX IF NOT EXISTS ix_track_genres_track_id ON track_genres (track_id)',
+        'CREATE INDEX IF NOT EXISTS ix_track_genres_genre_id ON track_genres (genre_id)',
+        'CREATE INDEX IF NOT EXISTS ix_reviews_track_id ON reviews (track_id)',
+        'CREATE INDEX IF NOT EXISTS ix_reviews_review_user ON reviews (review_user)',
+        'CREATE INDEX IF NOT EXISTS ix_liked_tracks_user ON liked_tracks (user)',
+        'CREATE INDEX IF NOT EXISTS ix_user_playlists_list_id ON user_playlists (list_id)',
+        'CREATE INDEX IF NOT EXISTS ix_playlists_playlist_user ON playlists (playlist_user)',
+        'CREATE INDEX IF NOT EXISTS ix_playlists_public ON playlists (public)'
+    )),
+    (2, 'Add the track_search full-text index and fill it with the tracks already in the database', (
+        *TRACK_SEARCH_DDL,
+        'DELETE FROM track_search',
+        '''INSERT INTO track_search (rowid, title, artist, album)
+            SELECT tracks.track_id, tracks.title, artists.full_name, albums.title FROM tracks
+            LEFT JOIN artists ON artists.artist_id = tracks.artist_id
+            LEFT JOIN albums ON albums.album_id = tracks.album_id'''
+    )),
+)
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+# The lookups run on every track, review, like and playlist page, as the repository issues them.
+HOT_QUERIES = {
+    'tracks by artist': 'SELECT track_id FROM tracks WHERE artist_id = 1',
+    'tracks by album': 'SELECT track_id FROM tracks WHERE album_id = 1',
+    'genres of a track': 'SELECT genre_id FROM track_genres WHERE track_id = 2',
+    'tracks of a genre': 'SELECT track_id FROM track_genres WHERE genre_id = 1',
+    'reviews of a track': 'SELECT * FROM reviews WHERE track_id = 2',
+    'reviews of a user': 'SELECT * FROM reviews WHERE review_user = 1',
+    'liked tracks of a user': 'SELECT track_id FROM liked_tracks WHERE user = 1',
+    'tracks of a playlist': 'SELECT track_id FROM user_playlists WHERE list_id = 1',
+    'playlists of a user': 'SELECT * FROM playlists WHERE playlist_user = 1',
+    'public playlists': 'SELECT * FROM playlists WHERE public = 1'
+}
+
+
+def get_schema_version(connection) -> int:
+    return connection.execute(text('PRAGMA user_version')).scalar()
+
+
+def migrate_database(engine) -> list:
+    """ Applies the migrations newer than the schema version of the database. Returns the versions applied.
+
+    The version is recorded after each migration. Its statements are idempotent, so a migration interrupted before
+    its version was recorded simply runs again the next time.
+    """
+    applied = []
+    with engine.connect() as connection:
+        current_version = get_schema_version(connection)
+    for version, description, statements in MIGRATIONS:
+        if version <= current_version:
+            continue
+        with engine.begin() as connection:
+            for statement in statements:
+                connection.execute(text(statement))
+            # PRAGMA does not take bound parameters, version is one of the integers above.
+            connection.execute(text(f'PRAGMA user_version = {int(version)}'))
+        applied.append(version)
+    return applied
+
+
+def explain_hot_queries(engine) -> dict:
+    """ Returns the EXPLAIN QUERY PLAN steps of every query in HOT_QUERIES, by query name. """
+    plans = dict()
+    with engine.connect() as connection:
+        for name, query in HOT_QUERIES.items():
+            plans[name] = [row[-1] for row in connection.execute(text(f'EXPLAIN QUERY PLAN {query}'))]
+    return plans
@@ -1,8 +1,9 @@
+import sqlite3
 from datetime import datetime
 from enum import unique
 from sqlalchemy import (
     Table, MetaData, Column, Integer, String, Date, DateTime, Boolean,
-    ForeignKey, func
+    ForeignKey, func, event, DDL
 )
 from sqlalchemy.orm import mapper, relationship, synonym
 
@@ -17,6 +18,9 @@ from music.domainmodel.user import User
 # global variable giving access to the MetaData (schema) information of the database
 metadata = MetaData()
 
+# Foreign keys are declared with index=True, so new databases get the indexes that migrations.py adds to existing
+# ones. Both use SQLAlchemy's default ix_<table>_<column> index names.
+
 users_table = Table(
     'users', metadata,
     Column('id', Integer, primary_key=True, autoincrement=True),
@@ -44,8 +48,8 @@ tracks_table = Table(
     'tracks', metadata,
     Column('track_id', Integer, primary_key=True, autoincrement=True),
     Column('title', String(255), nullable=False),
-    Column('artist_id', ForeignKey('artists.artist_id')),
-    Column('album_id', ForeignKey('albums.album_id')),
+    Column('artist_id', ForeignKey('artists.artist_id'), index=True),
+    Column('album_id', ForeignKey('albums.album_id'), index=True),
     Column('tracks_url', String(1024)),
     Column('track_duration', Integer)
 )
@@ -58,15 +62,15 @@ genre_table = Table(
 
 track_genre_table = Table(
     'track_genres', metadata,
-    Column('track_id', Integer, ForeignKey('tracks.track_id')),
-    Column('genre_id', Integer, ForeignKey('genres.genre_id'))
+    Column('track_id', Integer, ForeignKey('tracks.track_id'), index=True),
+    Column('genre_id', Integer, ForeignKey('genres.genre_id'), index=True)
 )
 
 reviews_table = Table(
     'reviews', metadata,
     Column('review_id', Integer, primary_key=True, autoincrement=True),
-    Column('review_user', ForeignKey('users.id')),
-    Column('track_id', ForeignKey('tracks.track_id')),
+    Column('review_user', ForeignKey('users.id'), index=True),
+    Column('track_id', ForeignKey('tracks.track_id'), index=True),
     Column('review_text', String(1024), nullable=False),
     Column('timestamp', DateTime, nullable=False, server_default=func.now()),
     Column('rating', Integer)
@@ -74,7 +78,7 @@ reviews_table = Table(
 
 liked_tracks_table = Table(
     'liked_tracks', metadata,
-    Column('user', ForeignKey('users.id')),
+    Column('user', ForeignKey('users.id'), index=True),
     Column('track_id', Integer, ForeignKey('tracks.track_id'))
 )
 
@@ -82,17 +86,78 @@ playlist_table = Table(
     'playlists', metadata,
     Column('playlist_id', Integer, primary_key=True, autoincrement=True),
     Column('playlist_title', String(255), nullable=False),
-    Column('playlist_user', ForeignKey('users.id')),
-    Column('public', Boolean, unique=False, default=False, nullable=False),
+    Column('playlist_user', ForeignKey('users.id'), index=True),
+    Column('public', Boolean, unique=False, default=False, nullable=False, index=True),
 )
 
 user_playlist_table = Table(
     'user_playlists', metadata,
     Column('track_id', ForeignKey('tracks.track_id')),
-    Column('list_id', Integer, ForeignKey('playlists.playlist_id'))
+    Column('list_id', Integer, ForeignKey('playlists.playlist_id'), index=True)
+)
+
+# Users that added another user's public playlist to their own playlists.
+playlist_subscribers_table = Table(
+    'playlist_subscribers', metadata,
+    Column('list_id', Integer, ForeignKey('playlists.playlist_id'), primary_key=True),
+    Column('user_id', ForeignKey('users.id'), primary_key=True, index=True)
+)
+
+# Row hash of every catalog track and album, used to refresh the catalog without rewriting unchanged rows. Tracks
+# that left the catalog are kept with removed set, so data referring to them stays intact.
+catalog_rows_table = Table(
+    'catalog_rows', metadata,
+    Column('entity', String(16), primary_key=True),
+    Column('entity_id', Integer, primary_key=True),
+    Column('row_hash', String(40), nullable=False),
+    Column('removed', Boolean, default=False, nullable=False)
 )
 
 
+# Full-text index of the title, artist name and album title of every track, used by the search page. Its rowid is the
+# track_id. The trigram tokenizer matches any case-insensitive substring of at least 3 characters, so searches keep
+# their substring semantics. Triggers keep it in sync with the tracks, artists and albums tables, whether rows are
+# written by the ORM or by the bulk loader.
+# The trigram tokenizer needs SQLite 3.34 or newer. With an older SQLite, track_search is a plain table with the same
+# columns and rowid, kept in sync by the same triggers, and searches scan it instead.
+TRACK_SEARCH_TABLE = 'track_search'
+SQLITE_HAS_TRIGRAM = sqlite3.sqlite_version_info >= (3, 34, 0)
+TRACK_SEARCH_FULLTEXT_DDL = \
+    "CREATE VIRTUAL TABLE IF NOT EXISTS track_search USING fts5(title, artist, album, tokenize = 'trigram')"
+TRACK_SEARCH_SCAN_DDL = "CREATE TABLE IF NOT EXISTS track_search (rowid INTEGER PRIMARY KEY, title, artist, album)"
+TRACK_SEARCH_DDL = (
+    TRACK_SEARCH_FULLTEXT_DDL if SQLITE_HAS_TRIGRAM else TRACK_SEARCH_SCAN_DDL,
+    """CREATE TRIGGER IF NOT EXISTS track_search_insert AFTER INSERT ON tracks BEGIN
+        INSERT INTO track_search (rowid, title, artist, album) VALUES (new.track_id, new.title,
+            (SELECT full_name FROM artists WHERE artist_id = new.artist_id),
+            (SELECT title FROM albums WHERE album_id = new.album_id));
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS track_search_update AFTER UPDATE ON tracks BEGIN
+        DELETE FROM track_search WHERE rowid = old.track_id;
+        INSERT INTO track_search (rowid, title, artist, album) VALUES (new.track_id, new.title,
+            (SELECT full_name FROM artists WHERE artist_id = new.artist_id),
+            (SELECT title FROM albums WHERE album_id = new.album_id));
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS track_search_delete AFTER DELETE ON tracks BEGIN
+        DELETE FROM track_search WHERE rowid = old.track_id;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS track_search_artist_update AFTER UPDATE OF full_name ON artists BEGIN
+        UPDATE track_search SET artist = new.full_name
+            WHERE rowid IN (SELECT track_id FROM tracks WHERE artist_id = new.artist_id);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS track_search_album_update AFTER UPDATE OF title ON albums BEGIN
+        UPDATE track_search SET album = new.title
+            WHERE rowid IN (SELECT track_id FROM tracks WHERE album_id = new.album_id);
+    END"""
+)
+
+# create_all and drop_all create and drop the index together with the tracks table. Existing databases get it from
+# the migrations.
+for statement in TRACK_SEARCH_DDL:
+    event.listen(tracks_table, 'after_create', DDL(statement).execute_if(dialect='sqlite'))
+event.listen(tracks_table, 'before_drop', DDL('DROP TABLE IF EXISTS track_search').execute_if(dialect='sqlite'))
+
+
 def map_model_to_tables():
     mapper(User, users_table, properties={
         '_User__user_id': users_table.c.id,
@@ -31,6 +31,11 @@ class AbstractRepository(abc.ABC):
         """
         raise NotImplementedError
 
+    @abc.abstractmethod
+    def get_user_by_id(self, user_id: int) -> User:
+        """ Returns the User with the given user_id from the repository, or None if there is no such User. """
+        raise NotImplementedError
+
     @abc.abstractmethod
     def add_track(self, track: Track):
         """ Adds a track to the repository. """
@@ -159,6 +164,19 @@ class AbstractRepository(abc.ABC):
         """ Returns the Reviews stored in the repository."""
         raise NotImplementedError
 
+    @abc.abstractmethod
+    def get_reviews_page(self, cursor: int, page_size: int, track: Track = None) -> List[Review]:
+        """ Returns up to page_size Reviews, from the cursor-th one on, in the order they were written.
+
+        Only the Reviews of track are paged through if one is given, all Reviews otherwise.
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def get_number_of_reviews(self, track: Track = None) -> int:
+        """ Returns the number of Reviews of track if one is given, of all Reviews otherwise. """
+        raise NotImplementedError
+
     @abc.abstractmethod
     def add_track_to_likes(self, user, track ):
         """ Adds track to users liked tracks."""
@@ -184,6 +202,16 @@ class AbstractRepository(abc.ABC):
         """ Returns all liked tracks of a specified user."""
         raise NotImplementedError
 
+    @abc.abstractmethod
+    def subscribe_to_playlist(self, user: User, playlist: PlayList):
+        """ Adds another user's public playlist to the playlists of user. """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def get_number_of_subscribers(self, playlist: PlayList) -> int:
+        """ Returns the number of users, other than its creator, that added the playlist to their playlists. """
+        raise NotImplementedError
+
     @abc.abstractmethod
     def get_user_playlists(self, user):
         """ Returns all liked tracks of a specified user."""
@@ -228,3 +256,29 @@ class AbstractRepository(abc.ABC):
     def change_vis_of_playlist(self, playlist: PlayList):
         """ removes a track from playlist."""
         raise NotImplementedError
+
+    @abc.abstractmethod
+    def get_catalog_row_hashes(self, entity: str) -> dict:
+        """ Returns the row hash of every stored catalog entity ('track' or 'album'), keyed by id.
+        Tombstoned tracks are left out.
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def upsert_album(self, album: Album, row_hash: str):
+        """ Adds an Album to the repository, or updates the stored Album with the same id. """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def upsert_track(self, track: Track, row_hash: str):
+        """ Adds a Track to the repository, or updates the stored Track with the same id.
+        A tombstoned Track is listed again.
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def remove_tracks(self, track_ids):
+        """ Tombstones the Tracks with the given ids. They are left out of listings and searches, but are kept so
+        reviews, liked tracks and playlists that refer to them stay intact.
+        """
+        raise NotImplementedError
@@ -0,0 +1,117 @@
+from array import array
+from bisect import bisect_left
+from collections import defaultdict
+
+# Length of the n-grams indexed. Keys of at least this length are answered by intersecting the posting lists of their
+# n-grams, shorter keys by scanning the texts.
+NGRAM_SIZE = 3
+
+# Posting lists hold unsigned ids, kept sorted, 4 bytes each instead of a Python int in a set.
+POSTING_TYPECODE = 'I'
+
+
+def ngrams(text: str, size: int = NGRAM_SIZE) -> set:
+    """ Returns every substring of text of exactly size characters. """
+    return {text[start:start + size] for start in range(len(text) - size + 1)}
+
+
+def _insert(posting: array, item_id: int):
+    position = bisect_left(posting, item_id)
+    if position == len(posting) or posting[position] != item_id:
+        posting.insert(position, item_id)
+
+
+def _delete(posting: array, item_id: int):
+    position = bisect_left(posting, item_id)
+    if position < len(posting) and posting[position] == item_id:
+        del posting[position]
+
+
+def _contains(posting: array, item_id: int) -> bool:
+    position = bisect_left(posting, item_id)
+    return position < len(posting) and posting[position] == item_id
+
+
+class NGramIndex:
+    """ Finds the ids of the texts that contain a substring, ignoring case, like str.find on lower-cased texts.
+
+    Every text is indexed by its trigrams, in sorted arrays of ids. A key of at least NGRAM_SIZE characters is looked
+    up by intersecting the posting lists of its trigrams, smallest first, and the few texts left are checked for the
+    whole key. Shorter keys are found by checking every text. The texts themselves are not copied, text_of returns
+    the current text of an id.
+    """
+
+    def __init__(self, text_of):
+        self.__text_of = text_of
+        # trigram -> sorted ids of the texts containing it
+        self.__postings = dict()
+        # sorted ids of all indexed texts
+        self.__ids = array(POSTING_TYPECODE)
+
+    def __len__(self) -> int:
+        return len(self.__ids)
+
+    def __contains__(self, item_id) -> bool:
+        return _contains(self.__ids, item_id)
+
+    def add(self, item_id: int, text: str):
+        """ Indexes text under item_id. A text indexed under item_id before must be removed first. """
+        _insert(self.__ids, item_id)
+        for ngram in ngrams((text or '').lower()):
+            posting = self.__postings.get(ngram)
+            if posting is None:
+                self.__postings[ngram] = array(POSTING_TYPECODE, (item_id,))
+            else:
+                _insert(posting, item_id)
+
+    def add_many(self, items):
+        """ Indexes the (item_id, text) pairs of items, merging each posting list once instead of once per text. """
+        new_postings = defaultdict(list)
+        new_ids = []
+        for item_id, text in items:
+            new_ids.append(item_id)
+            for ngram in ngrams((text or '').lower()):
+                new_postings[ngram].append(item_id)
+        if not new_ids:
+            return
+        self.__ids = array(POSTING_TYPECODE, sorted(set(self.__ids).union(new_ids)))
+        for ngram, item_ids in new_postings.items():
+            posting = self.__postings.get(ngram)
+            if posting is not None:
+                item_ids.extend(posting)
+            self.__postings[ngram] = array(POSTING_TYPECODE, sorted(set(item_ids)))
+
+    def remove(self, item_id: int, text: str):
+        """ Removes item_id, indexed with text. """
+        if item_id not in self:
+            return
+        _delete(self.__ids, item_id)
+        for ngram in ngrams((text or '').lower()):
+            posting = self.__postings.get(ngram)
+            if posting is None:
+                continue
+            _delete(posting, item_id)
+            if not posting:
+                del self.__postings[ngram]
+
+    def __matches(self, item_id: int, key: str) -> bool:
+        return key in (self.__text_of(item_id) or '').lower()
+
+    def search(self, key: str) -> list:
+        """ Returns the ids of the texts containing key, ignoring case, in ascending order. """
+        key = key.lower()
+        if key == '':
+            return list(self.__ids)
+        if len(key) < NGRAM_SIZE:
+            text_of = self.__text_of
+            return [item_id for item_id in self.__ids if key in (text_of(item_id) or '').lower()]
+
+        postings = []
+        for ngram in ngrams(key):
+            posting = self.__postings.get(ngram)
+            if posting is None:
+                return []
+            postings.append(posting)
+        postings.sort(key=len)
+        return [item_id for item_id in postings[0]
+                if all(_contains(posting, item_id) for posting in postings[1:]) and self.__matches(item_id, key)]
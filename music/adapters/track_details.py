@@ -0,0 +1,174 @@
+import ast
+import io
+import mmap
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from music.adapters.csvdatareader import read_csv_header, iter_record_ids, project_rows
+
+# Columns of the tracks csv file that are not kept on Track objects, but shown on the track page.
+TRACK_DETAIL_COLUMNS = ('track_listens', 'track_favorites', 'track_bit_rate', 'track_number', 'tags')
+
+# Number of tracks whose details are kept in memory by default.
+DETAILS_CACHE_SIZE = 1024
+
+# Seconds between two checks for changed tracks csv files, so requests do not stat every file.
+STALENESS_CHECK_SECONDS = 1.0
+
+details_instance = None
+
+
+def as_count(value):
+    return int(value) if value is not None and value.strip().isdigit() else None
+
+
+def create_track_details(detail_row: dict) -> dict:
+    """ Converts the TRACK_DETAIL_COLUMNS of a csv row into the details shown on the track page. """
+    try:
+        tags = ast.literal_eval(detail_row['tags']) if detail_row['tags'] else []
+    except (ValueError, SyntaxError):
+        tags = []
+    return {
+        'listens': as_count(detail_row['track_listens']),
+        'favorites': as_count(detail_row['track_favorites']),
+        'bit_rate': as_count(detail_row['track_bit_rate']),
+        'track_number': as_count(detail_row['track_number']),
+        'tags': [tag for tag in tags if type(tag) is str] if type(tags) is list else []
+    }
+
+
+class TrackDetails:
+    """ Extended metadata of tracks, read from the memory-mapped tracks csv files on demand.
+
+    The byte range of every track row is indexed by build_index, when the catalog is loaded, and only the row of the
+    requested track is parsed. The details of the most recently requested tracks are kept in a bounded LRU cache.
+    The files are checked for changes at most once every check_interval seconds and indexed again when they changed.
+    The maps of changed files are never read, requests get None until the new index is swapped in.
+    """
+
+    def __init__(self, tracks_csv_files: list, encoding: str = 'unicode_escape',
+                 cache_size: int = DETAILS_CACHE_SIZE, check_interval: float = STALENESS_CHECK_SECONDS):
+        self.__tracks_csv_files = list(tracks_csv_files)
+        self.__encoding = encoding
+        self.__cache_size = cache_size
+        self.__check_interval = check_interval
+        self.__cache = OrderedDict()
+        # Guards the index and the cache, never held while the files are scanned.
+        self.__lock = threading.Lock()
+        # Held by the one thread scanning the files.
+        self.__index_lock = threading.Lock()
+        # (size, mtime) of every file when it was indexed, to notice a changed catalog.
+        self.__file_states = None
+        # time.monotonic() of the last check for changed files, and whether the files changed since they were indexed.
+        self.__checked_at = None
+        self.__stale = False
+        self.__maps = []
+        self.__headers = []
+        # track_id -> (map index, start, end)
+        self.__offsets = dict()
+
+    @property
+    def cache_size(self) -> int:
+        return self.__cache_size
+
+    @property
+    def number_of_cached_tracks(self) -> int:
+        return len(self.__cache)
+
+    def get(self, track_id: int):
+        """ Returns the details of the track with track_id, or None if it is not in the tracks csv files. """
+        now = time.monotonic()
+        if self.__file_states is None or now - self.__checked_at >= self.__check_interval:
+            self.__checked_at = now
+            if self.__file_states != self.__current_file_states():
+                self.__stale = True
+        if self.__stale:
+            # Only the first request waits for the files to be indexed. While another thread indexes changed files,
+            # their old maps may be truncated or half written, so the track is not looked up.
+            if not self.__index_lock.acquire(blocking=self.__file_states is None):
+                return None
+            try:
+                if self.__stale:
+                    self.__build_index()
+            finally:
+                self.__index_lock.release()
+
+        with self.__lock:
+            details = self.__cache.get(track_id)
+            if details is not None:
+                self.__cache.move_to_end(track_id)
+                return details
+            if track_id not in self.__offsets:
+                return None
+
+            map_index, start, end = self.__offsets[track_id]
+            csv_source = io.TextIOWrapper(io.BytesIO(self.__headers[map_index] + self.__maps[map_index][start:end]),
+                                          encoding=self.__encoding)
+            details = create_track_details(next(project_rows(csv_source, TRACK_DETAIL_COLUMNS)))
+            self.__cache[track_id] = details
+            if len(self.__cache) > self.__cache_size:
+                self.__cache.popitem(last=False)
+            return details
+
+    def build_index(self):
+        """ Indexes the byte range of every row of the tracks csv files, replacing the current index. """
+        with self.__index_lock:
+            self.__build_index()
+
+    def close(self):
+        with self.__lock:
+            self.__close_maps()
+            self.__file_states = None
+            self.__stale = True
+
+    def __current_file_states(self) -> list:
+        states = []
+        for csv_file in self.__tracks_csv_files:
+            try:
+                status = os.stat(csv_file)
+                states.append((status.st_size, status.st_mtime_ns))
+            except OSError:
+                states.append(None)
+        return states
+
+    def __close_maps(self):
+        for data in self.__maps:
+            data.close()
+        self.__maps, self.__headers, self.__offsets = [], [], dict()
+        self.__cache.clear()
+
+    def __build_index(self):
+        # The files are scanned into a new index without holding the lock, which is only taken to swap it in.
+        file_states = self.__current_file_states()
+        maps, headers, offsets = [], [], dict()
+        try:
+            for csv_file, state in zip(self.__tracks_csv_files, file_states):
+                if state is None or state[0] == 0:
+                    continue
+                with open(csv_file, 'rb') as track_csv:
+                    data = mmap.mmap(track_csv.fileno(), 0, access=mmap.ACCESS_READ)
+                maps.append(data)
+                header_end, columns = read_csv_header(data, self.__encoding)
+                if 'track_id' not in columns:
+                    raise ValueError(f'{csv_file} has no column(s) track_id')
+
+                map_index = len(headers)
+                headers.append(data[:header_end])
+                for raw_track_id, start, end in iter_record_ids(data, header_end, columns.index('track_id'),
+                                                                self.__encoding):
+                    # Like the catalog, the first row of a track id read from the shards wins.
+                    if raw_track_id.isdigit():
+                        offsets.setdefault(int(raw_track_id), (map_index, start, end))
+        except Exception:
+            for data in maps:
+                data.close()
+            raise
+
+        with self.__lock:
+            self.__close_maps()
+            self.__maps, self.__headers, self.__offsets = maps, headers, offsets
+            self.__file_states = file_states
+            self.__checked_at = time.monotonic()
+            self.__stale = False
@@ -66,6 +66,8 @@ class Album:
         return f"<Album {self.title}, album id = {self.album_id}>"
 
     def __eq__(self, other) -> bool:
+        if self is other:
+            return True
         if not isinstance(other, self.__class__):
             return False
         return self.album_id == other.album_id
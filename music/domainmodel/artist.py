@@ -31,6 +31,8 @@ class Artist:
         return f"<Artist {self.full_name}, artist id = {self.artist_id}>"
 
     def __eq__(self, other):
+        if self is other:
+            return True
         if not isinstance(other, self.__class__):
             return False
         return self.artist_id == other.artist_id
@@ -30,6 +30,8 @@ class Genre:
         return f'<Genre {self.name}, genre id = {self.genre_id}>'
 
     def __eq__(self, other) -> bool:
+        if self is other:
+            return True
         if not isinstance(other, self.__class__):
             return False
         return self.genre_id == other.genre_id
@@ -0,0 +1,35 @@
+from flask import Blueprint, request, jsonify
+
+from music.adapters import catalog_warmup
+
+health_blueprint = Blueprint('health_bp', __name__)
+
+# Blueprints whose pages do not read the catalog, so they are served while it is loading.
+CATALOG_FREE_BLUEPRINTS = ('health_bp', 'authentication_bp')
+
+
+@health_blueprint.route('/healthz', methods=['GET'])
+def healthz():
+    # The process is up and answering requests, whether or not the catalog has loaded.
+    return jsonify(status='ok')
+
+
+@health_blueprint.route('/readyz', methods=['GET'])
+def readyz():
+    if catalog_warmup.catalog_is_ready():
+        return jsonify(status='ready')
+
+    warmup = catalog_warmup.warmup_instance
+    if warmup.error is not None:
+        return jsonify(status='failed', error=str(warmup.error)), 503
+    return jsonify(status='loading'), 503, {'Retry-After': str(catalog_warmup.RETRY_AFTER_SECONDS)}
+
+
+@health_blueprint.before_app_request
+def wait_for_catalog():
+    """ Answers catalog routes with 503 Service Unavailable until the catalog has loaded. """
+    if catalog_warmup.catalog_is_ready() or request.endpoint in (None, 'static') or \
+            request.blueprint in CATALOG_FREE_BLUEPRINTS:
+        return None
+    return 'The music catalog is still loading, please try again in a few seconds.', 503, \
+        {'Retry-After': str(catalog_warmup.RETRY_AFTER_SECONDS)}
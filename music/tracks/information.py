@@ -10,6 +10,7 @@ from wtforms import TextAreaField, HiddenField, SubmitField, SelectField
 from wtforms.validators import DataRequired, Length, NumberRange, ValidationError
 
 import music.adapters.repository as repo
+import music.adapters.track_details as track_details
 import music.utilities.utilities as utilities
 import music.tracks.services as services
 from music.utilities.utilities import create_playlist_form, PlaylistForm
@@ -30,6 +31,7 @@ def track(track_id: int):
         object = services.get_track_object_by_id(int(track_id), repo.repo_instance)
     except ValueError:
         abort(404)
+    details = services.get_track_details(int(track_id), track_details.details_instance)
 
     try:
         user = auth.get_user_object(session['user_name'], repo.repo_instance)
@@ -51,6 +53,7 @@ def track(track_id: int):
     track=track,
     user=user,
     object=object,
+    details=details,
     form = form
     )
 
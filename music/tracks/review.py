@@ -30,9 +30,13 @@ def review(track_id: int):
     prev_review_url = None
 
     try:
-        track = services.get_track_by_id(int(track_id), repo.repo_instance)
+        # Fetched once, the page shows its dict form and reads its reviews with the Track itself.
+        track_object = services.get_track_object_by_id(int(track_id), repo.repo_instance)
     except ValueError:
         abort(404)
+    if track_object is None:
+        abort(404)
+    track = services.track_to_dict(track_object)
     
     try:
         user = auth.get_user(session['user_name'], repo.repo_instance)['user_name']
@@ -48,7 +52,7 @@ def review(track_id: int):
         session.clear()
         pass
 
-    reviews = services.get_reviews(repo.repo_instance, track)
+    number_of_reviews = services.get_number_of_reviews(repo.repo_instance, track_object)
     
     form = ReviewForm()
     if form.validate_on_submit() and sesh:
@@ -69,7 +73,7 @@ def review(track_id: int):
         # Convert cursor from string to int.
         cursor = int(cursor)
     
-    reviews_to_be_displayed = reviews[cursor:cursor + reviews_per_page]
+    reviews_to_be_displayed = services.get_reviews_page(repo.repo_instance, cursor, reviews_per_page, track_object)
 
     cursor = (cursor // reviews_per_page) * reviews_per_page
     
@@ -80,12 +84,12 @@ def review(track_id: int):
 
     
 
-    if cursor + reviews_per_page < len(reviews):
+    if cursor + reviews_per_page < number_of_reviews:
         # There are further articles, so generate URLs for the 'next' and 'last' navigation buttons.
         next_review_url = url_for('review_bp.review', track_id=track_id, cursor=cursor + reviews_per_page)
     
-        last_cursor = reviews_per_page * int(len(reviews) / reviews_per_page)
-        if len(reviews) % reviews_per_page == 0:
+        last_cursor = reviews_per_page * int(number_of_reviews / reviews_per_page)
+        if number_of_reviews % reviews_per_page == 0:
             last_cursor -= reviews_per_page
         last_review_url = url_for('review_bp.review', track_id=track_id, cursor=last_cursor)
     
@@ -97,7 +101,7 @@ def review(track_id: int):
     sesh=sesh,
     form=form, 
     reviews = reviews_to_be_displayed,
-    leng = len(reviews),
+    leng = number_of_reviews,
     prev_track_url = prev_review_url,
     first_track_url = first_review_url,
     next_track_url = next_review_url,
@@ -128,7 +132,7 @@ def review_board():
         session.clear()
         pass
 
-    reviews = services.get_all_reviews(repo.repo_instance)
+    number_of_reviews = services.get_number_of_reviews(repo.repo_instance)
 
     cursor = request.args.get('cursor')
 
@@ -139,7 +143,7 @@ def review_board():
         # Convert cursor from string to int.
         cursor = int(cursor)
     
-    reviews_to_be_displayed = reviews[cursor:cursor + reviews_per_page]
+    reviews_to_be_displayed = services.get_reviews_page(repo.repo_instance, cursor, reviews_per_page)
 
     cursor = abs((cursor // reviews_per_page) * reviews_per_page)
     
@@ -150,12 +154,12 @@ def review_board():
 
     
 
-    if cursor + reviews_per_page < len(reviews):
+    if cursor + reviews_per_page < number_of_reviews:
         # There are further articles, so generate URLs for the 'next' and 'last' navigation buttons.
         next_review_url = url_for('review_bp.review_board', cursor=cursor + reviews_per_page)
     
-        last_cursor = reviews_per_page * int(len(reviews) / reviews_per_page)
-        if len(reviews) % reviews_per_page == 0:
+        last_cursor = reviews_per_page * int(number_of_reviews / reviews_per_page)
+        if number_of_reviews % reviews_per_page == 0:
             last_cursor -= reviews_per_page
         last_review_url = url_for('review_bp.review_board', cursor=last_cursor)
     
@@ -163,7 +167,7 @@ def review_board():
     user=user,
     sesh=sesh,
     reviews = reviews_to_be_displayed,
-    leng = len(reviews),
+    leng = number_of_reviews,
     prev_track_url = prev_review_url,
     first_track_url = first_review_url,
     next_track_url = next_review_url,
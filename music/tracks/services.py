@@ -2,6 +2,7 @@ from os import abort
 from typing import List, Iterable
 
 from music.adapters.repository import AbstractRepository
+from music.adapters.track_details import TrackDetails
 from music.domainmodel.playlist import PlayList
 from music.domainmodel.review import Review
 from music.domainmodel.track import Track
@@ -45,6 +46,12 @@ def get_track_by_id(track_id, repo: AbstractRepository):
 def get_track_object_by_id(track_id, repo: AbstractRepository): 
     return repo.get_track(track_id)
 
+def get_track_details(track_id, details: TrackDetails):
+    # Listens, favorites, bit rate, track number and tags, or an empty dict when the source file has no row for it.
+    if details is None:
+        return dict()
+    return details.get(track_id) or dict()
+
 def get_reviews(repo: AbstractRepository, track): 
     if track is None:
         raise NonExistentArticleException
@@ -69,6 +76,13 @@ def add_review(repo: AbstractRepository, track, review_text, rating, user):
 def get_all_reviews(repo: AbstractRepository): 
     return repo.get_all_reviews()
 
+def get_reviews_page(repo: AbstractRepository, cursor: int, page_size: int, track: Track = None):
+    # Only the reviews on the page are read, of the given track or of all tracks.
+    return repo.get_reviews_page(max(cursor, 0), page_size, track)
+
+def get_number_of_reviews(repo: AbstractRepository, track: Track = None) -> int:
+    return repo.get_number_of_reviews(track)
+
 def add_track_to_likes(repo: AbstractRepository, user: User, track: Track) -> None:
     """ Adds the given movie to the given user's watchlist. """
     repo.add_track_to_likes(user, track)
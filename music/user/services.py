@@ -23,6 +23,12 @@ def get_playlist_by_id(repo: AbstractRepository, id: int):
 def get_user_playlists(repo: AbstractRepository, user: User): 
     return repo.get_user_playlists(user)
 
+def get_user_playlist_ids(repo: AbstractRepository, user: User) -> set:
+    # Ids of the playlists the user created or subscribed to, none without a user.
+    if user is None:
+        return set()
+    return {playlist.list_id for playlist in repo.get_user_playlists(user)}
+
 def get_user_reviews(user, repo): 
     return repo.get_user_reviews(user)
 
@@ -39,4 +45,7 @@ def get_all_playlists(repo: AbstractRepository):
 
 def add_public_playlist(repo: AbstractRepository,user: User, playlist_id): 
     playlist = repo.get_playlist_by_id(int(playlist_id))
-    user.add_playlist(playlist)
\ No newline at end of file
+    repo.subscribe_to_playlist(user, playlist)
+
+def get_subscriber_counts(repo: AbstractRepository, playlists):
+    return {playlist.list_id: repo.get_number_of_subscribers(playlist) for playlist in playlists}
\ No newline at end of file
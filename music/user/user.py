@@ -370,6 +370,8 @@ def public_playlists():
     return render_template("all_playlists.html", 
     user=user, 
     playlists = playlists_to_be_displayed, 
+    subscribers = services.get_subscriber_counts(repo.repo_instance, playlists_to_be_displayed),
+    user_playlist_ids = services.get_user_playlist_ids(repo.repo_instance, user),
     leng = len(playlists), 
     first_track_url = first_track_url,
     prev_track_url = prev_track_url,
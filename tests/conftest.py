@@ -11,18 +11,24 @@ from utils import get_project_root
 # tests are written against the csv files in tests, this data path is used to override default path for testing
 TEST_DATA_PATH = get_project_root() / "tests" / "data"
 
+@pytest.fixture(scope='session')
+def catalog_cache_dir(tmp_path_factory):
+    # Shared by every test, so the csv files are only parsed once and later fixtures load the catalog snapshot.
+    return str(tmp_path_factory.mktemp('catalog_cache'))
+
 @pytest.fixture
-def in_memory_repo():
+def in_memory_repo(catalog_cache_dir):
     repo = MemoryRepository()
-    memory_repository.populate(TEST_DATA_PATH, repo)
+    memory_repository.populate(TEST_DATA_PATH, repo, cache_dir=catalog_cache_dir)
     return repo
 
 @pytest.fixture
-def client():
+def client(catalog_cache_dir):
     my_app = create_app({
         'TESTING': True,                                # Set to True during testing.
         'REPOSITORY': 'memory',                         # Don't be a dumb*** like me and spend an hour trying to figure how to make this BOTH WORK FOR DATABASE AND MEMORY AAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAA
         'TEST_DATA_PATH': TEST_DATA_PATH,               # Path for loading test data into the repository.
+        'CATALOG_CACHE_DIR': catalog_cache_dir,         # Snapshot of the parsed test catalog.
         'WTF_CSRF_ENABLED': False                       # test_client will not send a CSRF token, so disable validation.
     })
     return my_app.test_client()
@@ -1,7 +1,14 @@
+import threading
+
 import pytest
 
 from flask import session
 
+import music
+from music import create_app
+from music.adapters import catalog_warmup
+from conftest import TEST_DATA_PATH
+
 def test_register(client):
     # Check that we retrieve the register page.
     response_code = client.get('/authentication/register').status_code
@@ -116,6 +123,8 @@ def test_review(client, auth):
         data={'review': 'noobs are very cool and very special.', 'rating': '4'}
     )
     assert response.headers['Location'] == '/review/2'
+    # A track that is not in the catalog has no review page.
+    assert client.get('/review/123456789').status_code == 404
     
 @pytest.mark.parametrize(('review', 'rating','messages'), (
     ('Who thinks Trump is a f***wit?', '4',(b'Your comment must not contain profanity')),
@@ -145,6 +154,8 @@ def test_track_info_page(client):
     assert response.status_code == 200
     assert b'Food' in response.data
     assert b'Review' in response.data
+    # Extended details are read from the tracks csv file.
+    assert b'Listens' in response.data and b'1293' in response.data
 
 
 def test_review_board(client, auth): 
@@ -274,6 +285,7 @@ def test_playlist(client, auth):
     response = client.get('/public_playlists')
     assert response.status_code == 200
     assert b"hello" in response.data
+    assert b"0 subscribers" in response.data
     #add another playlist
     response = client.post(
         '/user/playlists',
@@ -290,4 +302,60 @@ def test_playlist(client, auth):
     response = client.get('/user/playlists')
     assert response.status_code == 200
     assert b"hello" not in response.data #Because hello got deleted!
-    assert b"euphoria" in response.data
\ No newline at end of file
+    assert b"euphoria" in response.data
+
+def test_catalog_routes_wait_for_background_load(catalog_cache_dir, monkeypatch):
+    # Hold the background load until the test releases it.
+    released = threading.Event()
+    populate = music.populate
+
+    def held_populate(*args):
+        released.wait()
+        populate(*args)
+
+    monkeypatch.setattr(music, 'populate', held_populate)
+    client = create_app({
+        'TESTING': True,
+        'REPOSITORY': 'memory',
+        'TEST_DATA_PATH': TEST_DATA_PATH,
+        'CATALOG_CACHE_DIR': catalog_cache_dir,
+        'CATALOG_BACKGROUND_LOAD': True,
+        'WTF_CSRF_ENABLED': False
+    }).test_client()
+
+    assert client.get('/healthz').status_code == 200
+    response = client.get('/readyz')
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == str(catalog_warmup.RETRY_AFTER_SECONDS)
+    response = client.get('/track/2')
+    assert response.status_code == 503
+    assert 'Retry-After' in response.headers
+    # Pages that do not read the catalog are served while it loads.
+    assert client.get('/authentication/login').status_code == 200
+
+    released.set()
+    assert catalog_warmup.warmup_instance.wait(30)
+    assert client.get('/readyz').status_code == 200
+    response = client.get('/track/2')
+    assert response.status_code == 200
+    assert b"Food" in response.data
+
+def test_subscribing_to_a_public_playlist(client, auth):
+    client.post('/authentication/register', data={'user_name': 'noob', 'password': 'Noob1234'})
+    auth.login()
+    client.post('/user/playlists', data={'playlist': 'hello'})
+    client.post('/user/changevisibility/1')
+    client.get('/authentication/logout')
+
+    client.post('/authentication/register', data={'user_name': 'listener', 'password': 'Listener1234'})
+    auth.login('listener', 'Listener1234')
+    response = client.get('/public_playlists')
+    assert b'0 subscribers' in response.data
+    assert b'/user/add_public_playlist/1' in response.data
+
+    response = client.post('/user/add_public_playlist/1')
+    assert response.status_code == 302
+    response = client.get('/public_playlists')
+    assert b'1 subscriber' in response.data
+    # The playlist is in the listener's playlists, so it can not be added again.
+    assert b'/user/add_public_playlist/1' not in response.data
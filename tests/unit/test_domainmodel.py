@@ -10,7 +10,10 @@ from music.domainmodel.review import Review
 from music.domainmodel.album import Album
 from music.domainmodel.user import User
 from music.domainmodel.playlist import PlayList
-from music.adapters.csvdatareader import TrackCSVReader
+from music.adapters.csvdatareader import (
+    TrackCSVReader, TRACK_COLUMNS, iter_projected_rows, GenreParser, parse_genre_list, split_csv_records, find_record_end,
+    AlbumIndex
+)
 
 
 class TestArtist:
@@ -782,3 +785,160 @@ class TestCSVReader:
         # genre id = 3>]'
         sorted_genre_sample = str(sorted_genres[:3])
         assert sorted_genre_sample == '[<Genre Avant-Garde, genre id = 1>, <Genre International, genre id = 2>, <Genre Blues, genre id = 3>]'
+
+    def test_iter_tracks(self):
+        dirname = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        albums_file_name = os.path.join(dirname, 'data/raw_albums_excerpt.csv')
+        tracks_file_name = os.path.join(dirname, 'data/raw_tracks_excerpt.csv')
+        reader = TrackCSVReader(albums_file_name, tracks_file_name, database_mode=False)
+
+        tracks = reader.iter_tracks()
+        first_track = next(tracks)
+        assert str(first_track) == '<Track Food, track id = 2>'
+        assert first_track.artist == Artist(1, 'AWOL')
+        assert first_track.album == Album(1, 'AWOL - A Way Of Life')
+        assert first_track.genres == [Genre(21, 'Hip-Hop')]
+
+        # The reader does not hold on to streamed tracks, but the datasets are complete once it is exhausted.
+        assert 1 + len(list(tracks)) == 2000
+        assert reader.dataset_of_tracks == []
+        assert len(reader.dataset_of_artists) == 263
+        assert len(reader.dataset_of_albums) == 427
+        assert len(reader.dataset_of_genres) == 60
+
+    def test_projected_track_rows(self):
+        dirname = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        albums_file_name = os.path.join(dirname, 'data/raw_albums_excerpt.csv')
+        tracks_file_name = os.path.join(dirname, 'data/raw_tracks_excerpt.csv')
+        reader = TrackCSVReader(albums_file_name, tracks_file_name, database_mode=False)
+
+        projected_rows = list(reader.iter_track_rows())
+        full_rows = reader.read_tracks_file()
+        assert len(projected_rows) == len(full_rows) == 2000
+        assert set(projected_rows[0].keys()) == set(TRACK_COLUMNS)
+        for projected_row, full_row in zip(projected_rows, full_rows):
+            assert projected_row == {column: full_row[column] for column in TRACK_COLUMNS}
+
+        assert reader.track_parse_stats.rows == 2000
+        assert reader.track_parse_stats.rows_per_second > 0
+
+    def test_projected_rows_missing_column(self):
+        dirname = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        albums_file_name = os.path.join(dirname, 'data/raw_albums_excerpt.csv')
+        with pytest.raises(ValueError, match='track_title'):
+            list(iter_projected_rows(albums_file_name, ('album_id', 'track_title')))
+
+    def test_genre_parser(self):
+        parser = GenreParser()
+        raw = "[{'genre_id': '76', 'genre_title': 'Experimental Pop', 'genre_url': 'http://freemusicarchive.org/genre/Experimental_Pop/'}, {'genre_id': '103', 'genre_title': 'Singer-Songwriter', 'genre_url': 'http://freemusicarchive.org/genre/Singer-Songwriter/'}]"
+        genres = parser.parse(raw)
+        assert genres == (Genre(76, 'Experimental Pop'), Genre(103, 'Singer-Songwriter'))
+
+        # Repeated values are served from the cache and genres are shared between different values.
+        assert parser.parse(raw) is genres
+        assert parser.parse("[{'genre_id': '76', 'genre_title': 'Experimental Pop'}]")[0] is genres[0]
+        assert parser.number_of_distinct_values == 2
+
+        assert parser.parse('') == ()
+        assert parser.parse('[]') == ()
+        assert parse_genre_list("[{'genre_id': '1', \"genre_title\": \"Children's\"},]") == [{'genre_id': '1', 'genre_title': "Children's"}]
+
+    def test_genre_parser_errors(self):
+        parser = GenreParser()
+        assert parser.parse("[{'genre_id': '1', 'genre_title'}]", track_id=7) == ()
+        assert parser.parse("[{'genre_title': 'Rock'}]", track_id=8) == ()
+        assert [error['track_id'] for error in parser.errors] == [7, 8]
+        assert parser.errors[0]['value'] == "[{'genre_id': '1', 'genre_title'}]"
+
+        with pytest.raises(ValueError):
+            parse_genre_list("[{'genre_id': '1'}] trailing")
+
+    def test_shared_genres(self):
+        reader = create_csv_reader()
+        genres = {}
+        for track in reader.dataset_of_tracks:
+            for genre in track.genres:
+                assert genres.setdefault(genre.genre_id, genre) is genre
+        assert reader.genre_parse_errors == []
+
+    def test_parallel_read_matches_serial(self):
+        dirname = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        albums_file_name = os.path.join(dirname, 'data/raw_albums_excerpt.csv')
+        tracks_file_name = os.path.join(dirname, 'data/raw_tracks_excerpt.csv')
+
+        def summary(reader, tracks):
+            return ([(track.track_id, track.title, track.track_url, track.track_duration, track.artist.full_name,
+                      track.album.album_id if track.album else None, [genre.genre_id for genre in track.genres])
+                     for track in tracks],
+                    sorted(reader.dataset_of_artists), sorted(reader.dataset_of_albums), sorted(reader.dataset_of_genres))
+
+        serial_reader = create_csv_reader()
+        parallel_reader = TrackCSVReader(albums_file_name, tracks_file_name, database_mode=False)
+        # Small chunks, so that many of them end next to multi-line quoted fields.
+        parallel_tracks = list(parallel_reader.iter_tracks(workers=2, chunk_size=20000))
+
+        assert summary(parallel_reader, parallel_tracks) == summary(serial_reader, serial_reader.dataset_of_tracks)
+        assert parallel_reader.track_parse_stats.rows == 2000
+
+    def test_split_csv_records(self):
+        data = b'id,text\n1,"two\nlines"\n2,"say ""hi""\nthere"\n3,plain\n'
+        ranges = split_csv_records(data, 1, find_record_end(data, 0, 0))
+        assert [data[start:end] for start, end in ranges] == [b'1,"two\nlines"\n', b'2,"say ""hi""\nthere"\n', b'3,plain\n']
+        assert split_csv_records(data, len(data)) == [(0, len(data))]
+
+    def test_canonical_entities(self):
+        reader = create_csv_reader()
+        artists, albums = {}, {}
+        for track in reader.dataset_of_tracks:
+            assert artists.setdefault(track.artist.artist_id, track.artist) is track.artist
+            if track.album is not None:
+                assert albums.setdefault(track.album.album_id, track.album) is track.album
+
+        # The datasets hold the same instances the tracks reference.
+        assert {id(artist) for artist in reader.dataset_of_artists} == {id(artist) for artist in artists.values()}
+        assert {id(album) for album in reader.dataset_of_albums} == {id(album) for album in albums.values()}
+        assert len(reader.registry.artists) == 263
+        assert len(reader.registry.genres) == 60
+
+        # Reading again keeps using the same canonical instances.
+        reader.read_csv_files()
+        assert reader.dataset_of_tracks[0].artist is artists[1]
+
+    def test_album_index(self):
+        dirname = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        albums_file_name = os.path.join(dirname, 'data/raw_albums_excerpt.csv')
+        album_dict = create_csv_reader().read_albums_file_as_dict()
+
+        album_index = AlbumIndex([albums_file_name])
+        assert len(album_index) == len(album_dict) == 427
+        assert album_index.number_of_materialised_albums == 0
+        assert 1 in album_index and 'invalid' not in album_index
+        assert album_index.get(123456789) is None
+
+        # Albums are only parsed when they are looked up, and then once.
+        album = album_index[1]
+        assert album_index.number_of_materialised_albums == 1
+        assert album_index[1] is album
+        for album_id, album in album_dict.items():
+            indexed_album = album_index[album_id]
+            assert (indexed_album.album_id, indexed_album.title, indexed_album.album_url, indexed_album.album_type,
+                    indexed_album.release_year) == (album.album_id, album.title, album.album_url, album.album_type,
+                                                    album.release_year)
+        album_index.close()
+        assert len(album_index) == 0 and album_index.get(1) is None
+
+    def test_lazy_albums_match_eager_albums(self):
+        dirname = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        albums_file_name = os.path.join(dirname, 'data/raw_albums_excerpt.csv')
+        tracks_file_name = os.path.join(dirname, 'data/raw_tracks_excerpt.csv')
+        eager_reader = TrackCSVReader(albums_file_name, tracks_file_name, False, lazy_albums=False)
+        lazy_reader = TrackCSVReader(albums_file_name, tracks_file_name, False)
+
+        eager_tracks, lazy_tracks = eager_reader.read_csv_files(), lazy_reader.read_csv_files()
+        assert [track.album.title if track.album else None for track in lazy_tracks] == \
+            [track.album.title if track.album else None for track in eager_tracks]
+        assert sorted(lazy_reader.dataset_of_albums) == sorted(eager_reader.dataset_of_albums)
+        assert eager_reader.album_index is None
+        assert lazy_reader.album_index.number_of_materialised_albums == len(lazy_reader.dataset_of_albums)
+        # The album files are released once the tracks are read.
+        assert len(lazy_reader.album_index) == 0
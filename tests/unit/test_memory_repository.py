@@ -1,5 +1,7 @@
 import pytest
 import os
+import shutil
+import copy
 from typing import List
 from music.adapters.memory_repository import MemoryRepository
 
@@ -10,16 +12,45 @@ from music.domainmodel.review import Review
 from music.domainmodel.album import Album
 from music.domainmodel.user import User
 from music.domainmodel.playlist import PlayList
-from music.adapters.csvdatareader import TrackCSVReader
+from music.adapters import memory_repository
+from music.adapters.csvdatareader import TrackCSVReader, TRACK_COLUMNS, iter_projected_rows, find_catalog_files, find_record_end, split_csv_records
+from music.adapters.catalog_snapshot import (CatalogSnapshot, read_catalog, load_snapshot, snapshot_file_name,
+                                             normalise_csv_file, catalog_reader)
+from music.adapters.catalog_delta import refresh_catalog, track_row_hash, TRACK_ENTITY
 from music.adapters.repository import RepositoryException
 from conftest import in_memory_repo
 
+def test_repository_can_retrieve_users_by_name_and_id(in_memory_repo):
+    user = User(1, 'Dave', '123456789')
+    in_memory_repo.add_user(user)
+    # A later user with a name already taken does not replace the first one.
+    in_memory_repo.add_user(User(2, 'dave', '987654321'))
+
+    assert in_memory_repo.get_user('dave') is user
+    assert in_memory_repo.get_user('prince') is None
+    assert in_memory_repo.get_user_by_id(1) is user
+    assert in_memory_repo.get_user_by_id(2).user_name == 'dave'
+    assert in_memory_repo.get_user_by_id(3) is None
+    assert in_memory_repo.get_number_of_users() == 2
+
 def test_repository_can_add_a_track(in_memory_repo):
     track = Track(4200, 'A Test Track')
     in_memory_repo.add_track(track)
 
     assert in_memory_repo.get_track(4200) is track
 
+def test_repository_can_add_tracks_in_bulk():
+    track_ids = [5, 3, 9, 1, 7, 2]
+    one_by_one, bulk = MemoryRepository(), MemoryRepository()
+    for track_id in track_ids:
+        one_by_one.add_track(Track(track_id, f'Track {track_id}'))
+    bulk.add_tracks(Track(track_id, f'Track {track_id}') for track_id in track_ids)
+
+    assert [track.track_id for track in bulk.get_tracks()] == sorted(track_ids)
+    assert bulk.get_tracks() == one_by_one.get_tracks()
+    assert bulk.get_track(7).title == 'Track 7'
+    assert bulk.get_number_of_tracks() == len(track_ids)
+
 def test_repository_can_retrieve_a_track(in_memory_repo):
     #Testing by track id
     track = in_memory_repo.get_track(2)
@@ -65,6 +96,29 @@ def test_repository_returns_empty_list_for_non_existent_ids(in_memory_repo):
     
     assert len(tracks) == 0
 
+def assert_lookups_match_a_scan_of_the_tracks(repo: MemoryRepository):
+    tracks = repo.get_tracks()
+    for artist in repo.get_artists() + [None]:
+        assert repo.get_tracks_by_artist(artist) == [track for track in tracks if track.artist == artist]
+    for album in repo.get_albums() + [None]:
+        assert repo.get_tracks_by_album(album) == [track for track in tracks if track.album == album]
+    for genre in repo.get_genres():
+        assert repo.get_tracks_by_genre(genre) == [track for track in tracks if genre in track.genres]
+        assert repo.get_track_ids_for_genre(genre.name.upper()) == \
+            [track.track_id for track in tracks if genre.name in (track_genre.name for track_genre in track.genres)]
+
+def test_repository_lookups_by_artist_album_and_genre_match_a_scan(in_memory_repo, tmp_path):
+    assert_lookups_match_a_scan_of_the_tracks(in_memory_repo)
+
+    # The indexes follow tracks that are added, changed and removed.
+    in_memory_repo.add_track(Track(4200, 'A Test Track'))
+    data_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data')
+    write_changed_catalog(data_path, tmp_path)
+    refresh_catalog(tmp_path, in_memory_repo)
+    assert_lookups_match_a_scan_of_the_tracks(in_memory_repo)
+    refresh_catalog(data_path, in_memory_repo)
+    assert_lookups_match_a_scan_of_the_tracks(in_memory_repo)
+
 def test_repository_can_add_a_genre(in_memory_repo):
     genre = Genre(4200, 'A Test Genre')
     in_memory_repo.add_genre(genre)
@@ -104,6 +158,37 @@ def test_repository_get_tracks_by_id(in_memory_repo:MemoryRepository):
     tracks6 = in_memory_repo.get_track_ids_for_genre("roock")
     assert len(tracks6) == 0
 
+def test_repository_title_search_matches_a_scan_of_the_titles(in_memory_repo:MemoryRepository):
+    def scan(key):
+        return [track.track_id for track in in_memory_repo.get_tracks() if key.lower() in track.title.lower()]
+
+    for key in ('', 'f', 'FO', 'foo', 'Food', 'the ', 'a way', '(', 'no title has this'):
+        assert in_memory_repo.get_track_ids_for_titles(key) == scan(key)
+
+    # The index follows tracks that are added, renamed and removed.
+    in_memory_repo.add_track(Track(4200, 'Seafood Blues'))
+    assert 4200 in in_memory_repo.get_track_ids_for_titles('afoo')
+    track = Track(4200, 'Seaweed Blues')
+    track.artist = Artist(4200, 'Someone')
+    in_memory_repo.upsert_track(track, '')
+    assert in_memory_repo.get_track_ids_for_titles('afoo') == scan('afoo')
+    assert in_memory_repo.get_track_ids_for_titles('weed b') == [4200]
+    in_memory_repo.remove_tracks([4200])
+    assert in_memory_repo.get_track_ids_for_titles('weed b') == []
+
+def test_repository_upsert_applies_a_cleared_duration(in_memory_repo:MemoryRepository):
+    stored_track = in_memory_repo.get_track(2)
+    assert stored_track.track_duration is not None
+    track = Track(2, stored_track.title)
+    track.artist = stored_track.artist
+    track.album = stored_track.album
+    track.track_url = stored_track.track_url
+    in_memory_repo.upsert_track(track, track_row_hash(track))
+
+    # Like the database, the stored track matches its new row hash.
+    assert in_memory_repo.get_track(2).track_duration is None
+    assert in_memory_repo.get_catalog_row_hashes(TRACK_ENTITY)[2] == track_row_hash(track)
+
 def test_repository_reviews(in_memory_repo:MemoryRepository): 
     track = in_memory_repo.get_track(2)
     assert track.title == "Food"
@@ -124,6 +209,24 @@ def test_repository_reviews(in_memory_repo:MemoryRepository):
     user1 = User(7232, 'gavi', 'gavi9281')
     user1.add_review(review1)
     assert len(in_memory_repo.get_user_reviews(user1)) == 1
+
+def test_repository_review_pages(in_memory_repo:MemoryRepository): 
+    track, other_track = in_memory_repo.get_track(2), in_memory_repo.get_track(3)
+    reviews = [Review(track if i % 2 == 0 else other_track, f"Review {i}", 3) for i in range(5)]
+    for review in reviews:
+        in_memory_repo.add_review(review.track, review)
+
+    # An equal review is a duplicate even when it is another object.
+    duplicate = copy.copy(reviews[0])
+    assert duplicate is not reviews[0] and duplicate == reviews[0]
+    in_memory_repo.add_review(track, duplicate)
+    assert in_memory_repo.get_number_of_reviews() == 5
+
+    assert in_memory_repo.get_reviews_page(1, 3) == reviews[1:4]
+    assert in_memory_repo.get_reviews_page(4, 3) == reviews[4:]
+    assert in_memory_repo.get_number_of_reviews(track) == 3
+    assert in_memory_repo.get_reviews_page(1, 5, track) == [reviews[2], reviews[4]]
+    assert in_memory_repo.get_reviews_page(0, 5, in_memory_repo.get_track(246)) == []
     
 def test_repository_likes(in_memory_repo:MemoryRepository): 
     track1 = in_memory_repo.get_track(2)
@@ -182,4 +285,192 @@ def test_repository_playlists(in_memory_repo:MemoryRepository):
 
     in_memory_repo.remove_playlist_from_lists(user, "play_list2")
     assert len(in_memory_repo.get_all_playlist()) == 1
-    
\ No newline at end of file
+    
+def test_repository_visible_playlists(in_memory_repo:MemoryRepository):
+    user = User(7232, 'gavi', 'gavi9281')
+    playlists = [PlayList(list_id, f'Playlist{list_id}') for list_id in (1, 2, 3)]
+    for playlist in playlists:
+        in_memory_repo.add_playlist_to_lists(user, playlist)
+    assert in_memory_repo.get_visible_playlists() == []
+    assert in_memory_repo.get_playlist_by_id(3) is playlists[2]
+
+    # Listed in the order they were added, like all playlists, whatever the order they were made public in.
+    in_memory_repo.change_vis_of_playlist(playlists[2])
+    in_memory_repo.change_vis_of_playlist(playlists[0])
+    assert in_memory_repo.get_visible_playlists() == [playlists[0], playlists[2]]
+    in_memory_repo.change_vis_of_playlist(playlists[1])
+    assert in_memory_repo.get_visible_playlists() == playlists
+    in_memory_repo.change_vis_of_playlist(playlists[1])
+
+    in_memory_repo.change_vis_of_playlist(playlists[2])
+    assert in_memory_repo.get_visible_playlists() == [playlists[0]]
+    in_memory_repo.remove_playlist_from_lists(user, playlists[0])
+    assert in_memory_repo.get_visible_playlists() == []
+    assert in_memory_repo.get_playlist_by_id(1) is None
+    assert in_memory_repo.get_all_playlist() == playlists[1:]
+
+def test_catalog_snapshot_is_reused_and_rebuilt(tmp_path):
+    data_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data')
+    albums_file_name = str(tmp_path / 'raw_albums_excerpt.csv')
+    tracks_file_name = str(tmp_path / 'raw_tracks_excerpt.csv')
+    shutil.copyfile(os.path.join(data_path, 'raw_albums_excerpt.csv'), albums_file_name)
+    shutil.copyfile(os.path.join(data_path, 'raw_tracks_excerpt.csv'), tracks_file_name)
+    source_files = [albums_file_name, tracks_file_name]
+    cache_dir = str(tmp_path / 'cache')
+
+    # The first read parses the csv files and writes the snapshot.
+    catalog = read_catalog(TrackCSVReader(albums_file_name, tracks_file_name, False), source_files, cache_dir)
+    assert isinstance(catalog, TrackCSVReader)
+
+    # Later reads load the snapshot, with the same content and shared artist instances.
+    snapshot = read_catalog(TrackCSVReader(albums_file_name, tracks_file_name, False), source_files, cache_dir)
+    assert isinstance(snapshot, CatalogSnapshot)
+    assert snapshot.dataset_of_tracks == catalog.dataset_of_tracks
+    assert snapshot.dataset_of_artists == catalog.dataset_of_artists
+    assert snapshot.dataset_of_albums == catalog.dataset_of_albums
+    assert snapshot.dataset_of_genres == catalog.dataset_of_genres
+    assert snapshot.track_parse_stats.rows == 2000
+    track = snapshot.dataset_of_tracks[0]
+    assert str(track) == '<Track Food, track id = 2>'
+    assert track.genres[0] is next(genre for genre in snapshot.dataset_of_genres if genre.genre_id == 21)
+
+    # A touched but unchanged file keeps the snapshot valid.
+    os.utime(tracks_file_name, ns=(0, 0))
+    assert load_snapshot(os.path.join(cache_dir, snapshot_file_name(source_files)), source_files) is not None
+
+    # Changing a csv file invalidates the snapshot, so it is rebuilt from the csv files.
+    with open(tracks_file_name, 'rb') as track_csv:
+        lines = track_csv.read().split(b'\n')
+    with open(tracks_file_name, 'wb') as track_csv:
+        track_csv.write(b'\n'.join(lines[:2] + [b'']))
+    rebuilt = read_catalog(TrackCSVReader(albums_file_name, tracks_file_name, False), source_files, cache_dir)
+    assert isinstance(rebuilt, TrackCSVReader)
+    assert len(rebuilt.dataset_of_tracks) == 1
+    assert len(read_catalog(TrackCSVReader(albums_file_name, tracks_file_name, False), source_files, cache_dir).dataset_of_tracks) == 1
+
+def write_shards(source_file, shard_files, overlap=0):
+    # Splits the records of a csv file over several files, each with the header line. Consecutive shards share
+    # overlap records, to check the cross-shard dedupe.
+    with open(source_file, 'rb') as source:
+        data = source.read()
+    header_end = find_record_end(data, 0, 0)
+    records = [data[start:end] for start, end in split_csv_records(data, 1, header_end)]
+    size = len(records) // len(shard_files) + 1
+    for index, shard_file in enumerate(shard_files):
+        os.makedirs(os.path.dirname(shard_file), exist_ok=True)
+        with open(shard_file, 'wb') as shard:
+            shard.write(data[:header_end] + b''.join(records[max(0, index * size - overlap):(index + 1) * size]))
+
+def test_repository_populates_from_sharded_catalog(in_memory_repo, tmp_path):
+    data_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data')
+    write_shards(os.path.join(data_path, 'raw_albums_excerpt.csv'),
+                 [str(tmp_path / 'part-1' / 'raw_albums_excerpt.csv'), str(tmp_path / 'part-2' / 'raw_albums_excerpt.csv')], overlap=10)
+    write_shards(os.path.join(data_path, 'raw_tracks_excerpt.csv'),
+                 [str(tmp_path / 'part-1' / 'raw_tracks_excerpt-1.csv'), str(tmp_path / 'part-1' / 'raw_tracks_excerpt-2.csv'),
+                  str(tmp_path / 'part-2' / 'raw_tracks_excerpt-3.csv')], overlap=25)
+
+    albums_files, tracks_files = find_catalog_files(tmp_path)
+    assert len(albums_files) == 2 and len(tracks_files) == 3
+    assert find_catalog_files(tmp_path / 'part-*') == (albums_files, tracks_files)
+    # UTF-8 copies in a cache folder inside the data folder are not shards.
+    normalise_csv_file(tracks_files[0], str(tmp_path / 'part-1' / 'cache'))
+    assert find_catalog_files(tmp_path) == (albums_files, tracks_files)
+
+    repo = MemoryRepository()
+    reader = memory_repository.populate(tmp_path / 'part-*', repo)
+    assert repo.get_number_of_tracks() == in_memory_repo.get_number_of_tracks() == 2000
+    assert [track.track_id for track in repo.get_tracks()] == [track.track_id for track in in_memory_repo.get_tracks()]
+    assert sorted(repo.get_artists()) == sorted(in_memory_repo.get_artists())
+    assert sorted(repo.get_albums()) == sorted(in_memory_repo.get_albums())
+    assert sorted(repo.get_genres()) == sorted(in_memory_repo.get_genres())
+    assert repo.get_track(2).album.title == 'AWOL - A Way Of Life'
+    assert len(repo.get_tracks_by_artist(Artist(1, 'AWOL'))) == 4
+
+    # Timings are reported per shard, the overlapping rows are parsed but only kept once.
+    assert set(reader.shard_stats) == set(albums_files + tracks_files)
+    assert sum(reader.shard_stats[tracks_file].rows for tracks_file in tracks_files) == 2000 + 2 * 25
+
+    # Parsing the shards in a process pool gives the same catalog.
+    parallel_repo = MemoryRepository()
+    memory_repository.populate(tmp_path, parallel_repo, workers=2)
+    assert [track.track_id for track in parallel_repo.get_tracks()] == [track.track_id for track in repo.get_tracks()]
+
+def write_changed_catalog(data_path, target_path):
+    # Copies the catalog with track 2 renamed, track 3 removed, a new track 999999 and album 1 renamed.
+    os.makedirs(target_path, exist_ok=True)
+    with open(os.path.join(data_path, 'raw_tracks_excerpt.csv'), 'rb') as source:
+        data = source.read()
+    header_end = find_record_end(data, 0, 0)
+    records = [data[start:end] for start, end in split_csv_records(data, 1, header_end)]
+    renamed = records[0].replace(b',Food,', b',Food (Remastered),')
+    added = b'999999' + records[0][len(b'2'):]
+    with open(os.path.join(target_path, 'raw_tracks_excerpt.csv'), 'wb') as target:
+        target.write(data[:header_end] + renamed + b''.join(records[2:]) + added)
+
+    with open(os.path.join(data_path, 'raw_albums_excerpt.csv'), 'rb') as source:
+        data = source.read()
+    with open(os.path.join(target_path, 'raw_albums_excerpt.csv'), 'wb') as target:
+        target.write(data.replace(b',AWOL - A Way Of Life,', b',AWOL - A Way Of Life (Deluxe),', 1))
+
+def test_repository_refreshes_only_changed_catalog_rows(in_memory_repo, tmp_path):
+    data_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data')
+    write_changed_catalog(data_path, tmp_path)
+    user = User(1, 'dave', '123456789')
+    track_2, track_3 = in_memory_repo.get_track(2), in_memory_repo.get_track(3)
+    in_memory_repo.add_track_to_likes(user, track_3)
+
+    delta = refresh_catalog(tmp_path, in_memory_repo)
+    assert (delta.added, delta.updated, delta.removed, delta.albums_changed) == (1, 1, 1, 1)
+    assert delta.unchanged == 1998
+    assert in_memory_repo.get_number_of_tracks() == 2000
+
+    # Changed rows are updated in place, so every reference to the track sees the change.
+    assert in_memory_repo.get_track(2) is track_2
+    assert track_2.title == 'Food (Remastered)'
+    assert track_2.album.title == 'AWOL - A Way Of Life (Deluxe)'
+    assert in_memory_repo.get_track(999999).artist is track_2.artist
+
+    # The removed track is tombstoned: not listed or found, but still there for the user that liked it.
+    assert 3 not in in_memory_repo.get_all_track_ids()
+    assert 3 not in in_memory_repo.get_track_ids_for_artist('AWOL')
+    assert in_memory_repo.get_track(3) is track_3
+    assert in_memory_repo.get_all_liked_tracks(user) == [track_3]
+
+    assert refresh_catalog(tmp_path, in_memory_repo).rows_written == 0
+
+    # Back to the original catalog, the tombstoned track is listed again.
+    delta = refresh_catalog(data_path, in_memory_repo)
+    assert (delta.added, delta.updated, delta.removed, delta.albums_changed) == (1, 1, 1, 1)
+    assert 3 in in_memory_repo.get_all_track_ids()
+    assert in_memory_repo.get_track(3) is track_3
+    assert track_2.title == 'Food'
+
+def test_catalog_is_read_from_utf8_copies(tmp_path):
+    data_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data')
+    tracks_file = str(tmp_path / 'raw_tracks_excerpt.csv')
+    shutil.copy(os.path.join(data_path, 'raw_tracks_excerpt.csv'), tracks_file)
+    cache_dir = str(tmp_path / 'cache')
+
+    # The copy holds the same text, so it parses to the same rows with the utf-8 codec.
+    normalised_file = normalise_csv_file(tracks_file, cache_dir)
+    assert list(iter_projected_rows(normalised_file, TRACK_COLUMNS, encoding='utf-8')) == \
+        list(iter_projected_rows(tracks_file, TRACK_COLUMNS))
+
+    # It is only converted again once the source file changes.
+    converted_at = os.stat(normalised_file).st_mtime_ns
+    assert normalise_csv_file(tracks_file, cache_dir) == normalised_file
+    assert os.stat(normalised_file).st_mtime_ns == converted_at
+    with open(tracks_file, 'a', encoding='utf-8') as source:
+        source.write('\n')
+    os.utime(normalised_file, ns=(0, 0))
+    normalise_csv_file(tracks_file, cache_dir)
+    assert os.stat(normalised_file).st_mtime_ns != 0
+
+    albums_file = os.path.join(data_path, 'raw_albums_excerpt.csv')
+    reader = catalog_reader([albums_file], [tracks_file], cache_dir=cache_dir)
+    source_reader = TrackCSVReader(albums_file, tracks_file, False)
+    assert reader.source_files != source_reader.source_files
+    assert reader.read_csv_files(workers=2) == source_reader.read_csv_files()
+    assert sorted(reader.dataset_of_albums) == sorted(source_reader.dataset_of_albums)
+    assert [(track.title, track.artist.full_name, track.genres) for track in reader.dataset_of_tracks] == \
+        [(track.title, track.artist.full_name, track.genres) for track in source_reader.dataset_of_tracks]
@@ -4,6 +4,9 @@ from music.authentication.services import AuthenticationException
 from music.tracks import services as tracks_services
 from music.authentication import services as auth_services
 from music.user import services as user_services
+from music.adapters.track_details import TrackDetails
+from music.adapters.catalog_snapshot import normalise_csv_file
+from utils import get_project_root
 #from music.tracks.services import NonExistentArticleException
 
 
@@ -273,6 +276,10 @@ def test_adding_public_playlist(in_memory_repo):
     title = 'A Test Playlist'
     user_services.add_playlist(in_memory_repo, title, user)
     user_services.change_visibility(in_memory_repo, user, 1)
+    # Its creator adding it is not a subscriber.
+    user_services.add_public_playlist(in_memory_repo, user, 1)
+    playlist = user_services.get_playlist_by_id(in_memory_repo, 1)
+    assert user_services.get_subscriber_counts(in_memory_repo, [playlist]) == {1: 0}
 
     new_user_name = 'pmccartney'
     new_password = 'abcd1A23'
@@ -283,3 +290,46 @@ def test_adding_public_playlist(in_memory_repo):
 
     user_services.add_public_playlist(in_memory_repo, user2, 1)
     assert len(user_services.get_user_playlists(in_memory_repo, user2)) == 1  
+    playlist = user_services.get_playlist_by_id(in_memory_repo, 1)
+    assert user_services.get_subscriber_counts(in_memory_repo, [playlist]) == {1: 1}
+
+    # Deleting the playlist takes it from its subscribers too.
+    user_services.remove_playlist(in_memory_repo, user, 1)
+    assert user_services.get_user_playlists(in_memory_repo, user2) == []
+
+def test_getting_track_details():
+    details = TrackDetails([str(get_project_root() / 'tests' / 'data' / 'raw_tracks_excerpt.csv')], cache_size=2)
+
+    track_details = tracks_services.get_track_details(2, details)
+    assert track_details == {'listens': 1293, 'favorites': 2, 'bit_rate': 256000, 'track_number': 3, 'tags': []}
+    assert tracks_services.get_track_details(137, details)['tags'] == ['lafms']
+    assert tracks_services.get_track_details(123456789, details) == {}
+    assert tracks_services.get_track_details(2, None) == {}
+
+    # Only the most recently used details are kept.
+    assert details.number_of_cached_tracks == 2
+    tracks_services.get_track_details(166, details)
+    assert details.number_of_cached_tracks == 2
+    assert tracks_services.get_track_details(2, details)['listens'] == 1293
+
+def test_getting_track_details_from_the_utf8_copy(tmp_path):
+    tracks_file = str(get_project_root() / 'tests' / 'data' / 'raw_tracks_excerpt.csv')
+    details = TrackDetails([normalise_csv_file(tracks_file, str(tmp_path))], 'utf-8')
+    # Indexed up front, as when the catalog is loaded, so no request scans the file.
+    details.build_index()
+    assert tracks_services.get_track_details(2, details)['listens'] == 1293
+    assert tracks_services.get_track_details(137, details)['tags'] == ['lafms']
+
+def test_getting_track_details_of_changed_files(tmp_path):
+    tracks_file = tmp_path / 'raw_tracks_excerpt.csv'
+    header = 'track_id,track_listens,track_favorites,track_bit_rate,track_number,tags\n'
+    tracks_file.write_text(header + '2,1293,2,256000,3,[]\n', encoding='utf-8')
+    details = TrackDetails([str(tracks_file)], 'utf-8', check_interval=0)
+    assert tracks_services.get_track_details(2, details)['listens'] == 1293
+
+    tracks_file.write_text(header + '2,12930,2,256000,3,[]\n', encoding='utf-8')
+    # While another thread indexes the changed file its old map is not read.
+    with details._TrackDetails__index_lock:
+        assert tracks_services.get_track_details(2, details) == {}
+    assert tracks_services.get_track_details(2, details)['listens'] == 12930
+    details.close()
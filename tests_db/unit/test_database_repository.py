@@ -1,6 +1,7 @@
 from datetime import date
 from typing import List
 import pytest
+from sqlalchemy import text
 import os
 
 from music.domainmodel.artist import Artist
@@ -10,12 +11,15 @@ from music.domainmodel.review import Review
 from music.domainmodel.album import Album
 from music.domainmodel.user import User
 from music.domainmodel.playlist import PlayList
-from music.adapters.csvdatareader import TrackCSVReader
+from music.adapters.csvdatareader import TrackCSVReader, find_record_end, split_csv_records
+from music.adapters.catalog_delta import refresh_catalog
+from music.adapters.migrations import MIGRATIONS
+from music.adapters.orm import TRACK_SEARCH_SCAN_DDL
 
 import music.adapters.repository as repo
 from music.adapters.database_repository import SqlAlchemyRepository, SessionContextManager
 from music.adapters.repository import RepositoryException
-from tests_db.configtest import session_factory
+from tests_db.configtest import session_factory, TEST_DATA_PATH_DATABASE_FULL
 
 
 def test_repository_can_add_a_user(session_factory):
@@ -36,6 +40,8 @@ def test_repository_can_retrieve_a_user(session_factory):
     repo.add_user(User(user_id, user_name='fmercury', password='8734gfe2058v'))
     user = repo.get_user('fmercury')
     assert user == User(user_id, user_name='fmercury', password='8734gfe2058v')
+    assert repo.get_user_by_id(user_id) is user
+    assert repo.get_user_by_id(user_id + 1) is None
 
 def test_repository_does_not_retrieve_a_non_existent_user(session_factory):
     repo = SqlAlchemyRepository(session_factory)
@@ -165,11 +171,38 @@ def test_repository_get_tracks_by_id(session_factory):
     
     track5 = repo.get_track_ids_for_genre("rock")
     assert len(track5) == 542
+    assert repo.get_track_ids_for_genre("ROCK") == sorted(track5)
 
     #Genres have to be properly typed
     tracks6 = repo.get_track_ids_for_genre("roock")
     assert len(tracks6) == 0
 
+    # Searches match any part of a title, artist name or album title, whatever its length or case.
+    assert repo.get_track_ids_for_titles("FOO")[0] == 2
+    assert repo.get_track_ids_for_titles("Fo")[0] == 2
+    assert repo.get_track_ids_for_artist("awol") == [2, 3, 5, 134]
+    assert repo.get_track_ids_for_album("Way Of L") == [2, 3, 5, 134]
+    # Quotes in the search are matched as they are.
+    assert repo.get_track_ids_for_titles('"no" "such" title') == []
+
+def test_repository_searches_without_the_trigram_index(session_factory):
+    repo = SqlAlchemyRepository(session_factory)
+    searches = [(repo.get_track_ids_for_titles, 'FOO'), (repo.get_track_ids_for_artist, 'awol'),
+                (repo.get_track_ids_for_album, 'Way Of L'), (repo.get_track_ids_for_titles, 'Fo')]
+    expected = [search(key) for search, key in searches]
+
+    # The track_search table of a database created by a SQLite older than 3.34.
+    session = session_factory()
+    session.execute(text('DROP TABLE track_search'))
+    session.execute(text(TRACK_SEARCH_SCAN_DDL))
+    session.execute(text(MIGRATIONS[1][2][-1]))
+    session.commit()
+    assert [search(key) for search, key in searches] == expected
+
+    # Tracks that left the catalog are still left out.
+    repo.remove_tracks([3])
+    assert 3 not in repo.get_track_ids_for_artist('AWOL')
+
 def test_repository_reviews(session_factory): 
     repo = SqlAlchemyRepository(session_factory)
 
@@ -193,6 +226,19 @@ def test_repository_reviews(session_factory):
     user1.add_review(review1)
     assert len(repo.get_user_reviews(user1)) == 1
 
+def test_repository_review_pages(session_factory): 
+    repo = SqlAlchemyRepository(session_factory)
+    track, other_track = repo.get_track(2), repo.get_track(3)
+    reviews = [Review(track if i % 2 == 0 else other_track, f"Review {i}", 3) for i in range(5)]
+    for review in reviews:
+        repo.add_review(review.track, review)
+
+    assert repo.get_number_of_reviews() == 5
+    assert repo.get_reviews_page(1, 3) == reviews[1:4]
+    assert repo.get_reviews_page(4, 3) == reviews[4:]
+    assert repo.get_number_of_reviews(track) == 3
+    assert repo.get_reviews_page(1, 5, track) == [reviews[2], reviews[4]]
+
 def test_repository_likes(session_factory): 
     repo = SqlAlchemyRepository(session_factory)
     track1 = repo.get_track(2)
@@ -255,4 +301,80 @@ def test_repository_playlists(session_factory):
 
     repo.remove_playlist_from_lists(user, play_list2)
     assert len(repo.get_all_playlist()) == 1
-    
\ No newline at end of file
+    
+
+
+def test_repository_playlist_subscribers(session_factory):
+    repo = SqlAlchemyRepository(session_factory)
+    user, user2 = User(7232, 'gavi', 'gavi9281'), User(722, 'gavii', 'gavvi9281')
+    repo.add_user(user)
+    repo.add_user(user2)
+    play_list = PlayList(1, 'Playlist1')
+    play_list.user = user
+    repo.add_playlist_to_lists(user, play_list)
+    assert repo.get_number_of_subscribers(play_list) == 0
+    # Its creator adding it again is not a subscriber.
+    repo.subscribe_to_playlist(user, play_list)
+    assert repo.get_number_of_subscribers(play_list) == 0
+
+    repo.subscribe_to_playlist(user2, play_list)
+    repo.subscribe_to_playlist(user2, play_list)
+    assert repo.get_number_of_subscribers(play_list) == 1
+    # The playlist is listed for its subscriber but still belongs to its creator.
+    assert repo.get_user_playlists(user2) == [play_list]
+    assert repo.get_playlist_by_id(1).user is user
+
+    repo.remove_playlist_from_lists(user, play_list)
+    assert repo.get_user_playlists(user2) == []
+    assert repo.get_number_of_subscribers(play_list) == 0
+
+def write_changed_catalog(data_path, target_path):
+    # Copies the catalog with track 2 renamed, track 3 removed, a new track 999999 and album 1 renamed.
+    with open(os.path.join(data_path, 'raw_tracks_excerpt.csv'), 'rb') as source:
+        data = source.read()
+    header_end = find_record_end(data, 0, 0)
+    records = [data[start:end] for start, end in split_csv_records(data, 1, header_end)]
+    renamed = records[0].replace(b',Food,', b',Food (Remastered),')
+    added = b'999999' + records[0][len(b'2'):]
+    with open(os.path.join(target_path, 'raw_tracks_excerpt.csv'), 'wb') as target:
+        target.write(data[:header_end] + renamed + b''.join(records[2:]) + added)
+
+    with open(os.path.join(data_path, 'raw_albums_excerpt.csv'), 'rb') as source:
+        data = source.read()
+    with open(os.path.join(target_path, 'raw_albums_excerpt.csv'), 'wb') as target:
+        target.write(data.replace(b',AWOL - A Way Of Life,', b',AWOL - A Way Of Life (Deluxe),', 1))
+
+def test_repository_refreshes_only_changed_catalog_rows(session_factory, tmp_path):
+    repo = SqlAlchemyRepository(session_factory)
+    write_changed_catalog(TEST_DATA_PATH_DATABASE_FULL, tmp_path)
+    user = User(7232, 'gavi', 'gavi9281')
+    repo.add_user(user)
+    repo.add_track_to_likes(user, repo.get_track(3))
+
+    delta = refresh_catalog(tmp_path, repo)
+    assert (delta.added, delta.updated, delta.removed, delta.albums_changed) == (1, 1, 1, 1)
+    assert delta.unchanged == 1998
+
+    repo.reset_session()
+    assert repo.get_number_of_tracks() == 2000
+    assert repo.get_track(2).title == 'Food (Remastered)'
+    assert repo.get_track(2).album.title == 'AWOL - A Way Of Life (Deluxe)'
+    assert repo.get_track(999999).artist == repo.get_track(2).artist
+
+    # The removed track is tombstoned: not listed or found, but its row and the user's like are kept.
+    assert 3 not in repo.get_all_track_ids()
+    assert 3 not in repo.get_track_ids_for_artist('AWOL')
+    # The search index follows the changed track and album titles.
+    assert repo.get_track_ids_for_titles('Remastered') == [2]
+    assert 2 in repo.get_track_ids_for_album('(Deluxe)')
+    assert repo.get_track(3) is not None
+    assert [track.track_id for track in repo.get_user('gavi').liked_tracks] == [3]
+
+    assert refresh_catalog(tmp_path, repo).rows_written == 0
+
+    # Back to the original catalog, the tombstoned track is listed again.
+    delta = refresh_catalog(TEST_DATA_PATH_DATABASE_FULL, repo)
+    assert (delta.added, delta.updated, delta.removed, delta.albums_changed) == (1, 1, 1, 1)
+    repo.reset_session()
+    assert 3 in repo.get_all_track_ids()
+    assert repo.get_track(2).title == 'Food'
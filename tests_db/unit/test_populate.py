@@ -1,19 +1,31 @@
-from sqlalchemy import select, inspect
-from tests_db.configtest import database_engine
+from sqlalchemy import create_engine, select, inspect, func
+from sqlalchemy.orm import clear_mappers
+from tests_db.configtest import database_engine, session_factory, TEST_DATA_PATH_DATABASE_LIMITED
 
-from music.adapters.orm import metadata
+import os
+import shutil
+import sqlite3
+
+from music import create_app
+import music.adapters.repository as repo
+from music.adapters import database_repository
+from music.adapters import catalog_warmup
+from music.adapters.catalog_artifact import build_catalog_artifact, verify_catalog_artifact, install_catalog_artifact
+from music.adapters.migrations import SCHEMA_VERSION
+from music.adapters.database_engine import create_database_engine
+from music.adapters.orm import metadata, tracks_table, track_genre_table, catalog_rows_table
 
 def test_database_populate_inspect_table_names(database_engine):
 
     # Get table information
     inspector = inspect(database_engine)
-    assert inspector.get_table_names() == ['albums', 'artists', 'genres', 'liked_tracks', 'playlists', 'reviews', 'track_genres', 'tracks', 'user_playlists', 'users']
+    assert inspector.get_table_names() == ['albums', 'artists', 'catalog_rows', 'genres', 'liked_tracks', 'playlist_subscribers', 'playlists', 'reviews', 'track_genres', 'track_search', 'track_search_config', 'track_search_content', 'track_search_data', 'track_search_docsize', 'track_search_idx', 'tracks', 'user_playlists', 'users']
 
 def test_database_populate_select_all_genres(database_engine):
 
     # Get table information
     inspector = inspect(database_engine)
-    name_of_genres_table = inspector.get_table_names()[2]
+    name_of_genres_table = inspector.get_table_names()[3]
 
     with database_engine.connect() as connection:
         # query for records in table tags
@@ -30,7 +42,7 @@ def test_database_populate_select_all_users(database_engine):
 
     # Get table information
     inspector = inspect(database_engine)
-    name_of_users_table = inspector.get_table_names()[4]
+    name_of_users_table = inspector.get_table_names()[5]
 
     with database_engine.connect() as connection:
         # query for records in table users
@@ -47,7 +59,7 @@ def test_database_populate_select_all_track_genre(database_engine):
 
     # Get table information
     inspector = inspect(database_engine)
-    name_of_track_genres_table = inspector.get_table_names()[6]
+    name_of_track_genres_table = inspector.get_table_names()[8]
 
     with database_engine.connect() as connection:
         # query for records in table comments
@@ -64,7 +76,7 @@ def test_database_populate_select_all_articles(database_engine):
 
     # Get table information
     inspector = inspect(database_engine)
-    name_of_articles_table = inspector.get_table_names()[7]
+    name_of_articles_table = inspector.get_table_names()[15]
 
     with database_engine.connect() as connection:
         # query for records in table articles
@@ -79,3 +91,213 @@ def test_database_populate_select_all_articles(database_engine):
         assert nr_articles == 2000
 
         assert all_tracks[0] == (2, 'Food')
+
+def test_database_populate_in_several_batches(session_factory, monkeypatch):
+    # session_factory is populated with BULK_BATCH_SIZE tracks per transaction, load the same catalog in small batches.
+    engine = session_factory.kw['bind']
+    for table in reversed(metadata.sorted_tables):
+        engine.execute(table.delete())
+    monkeypatch.setattr(database_repository, 'BULK_BATCH_SIZE', 300)
+    repo = database_repository.SqlAlchemyRepository(session_factory)
+    database_repository.populate_two(TEST_DATA_PATH_DATABASE_LIMITED, repo, True)
+
+    with engine.connect() as connection:
+        assert connection.execute(select(func.count()).select_from(tracks_table)).scalar() == 2000
+        assert connection.execute(select(func.count()).select_from(catalog_rows_table)).scalar() == 2000 + 427
+        track_genres = connection.execute(select(track_genre_table.c.genre_id).where(
+            track_genre_table.c.track_id == 20)).scalars().all()
+        assert track_genres == [76, 103]
+
+    assert len(repo.get_artists()) == 263
+    assert len(repo.get_genres()) == 60
+    assert len(repo.get_albums()) == 427
+    assert [genre.genre_id for genre in repo.get_track(20).genres] == [76, 103]
+    assert repo.get_track(2).album.title == 'AWOL - A Way Of Life'
+
+def test_catalog_artifact_is_built_verified_and_installed(tmp_path):
+    artifact_file = str(tmp_path / 'catalog.db')
+    manifest = build_catalog_artifact(TEST_DATA_PATH_DATABASE_LIMITED, artifact_file)
+    assert manifest['size'] == os.path.getsize(artifact_file)
+    assert verify_catalog_artifact(artifact_file, TEST_DATA_PATH_DATABASE_LIMITED) is None
+
+    connection = sqlite3.connect(artifact_file)
+    try:
+        assert connection.execute('SELECT count(*) FROM tracks').fetchone()[0] == 2000
+        indexes = {row[0] for row in connection.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+        assert {'ix_tracks_artist_id', 'ix_tracks_album_id', 'ix_track_genres_track_id'} <= indexes
+        # ANALYZE has been run, so the query planner has statistics for the indexes.
+        assert connection.execute('SELECT count(*) FROM sqlite_stat1').fetchone()[0] > 0
+    finally:
+        connection.close()
+
+    database_file = str(tmp_path / 'music.db')
+    assert install_catalog_artifact(artifact_file, database_file, TEST_DATA_PATH_DATABASE_LIMITED)
+    with open(database_file, 'rb') as database, open(artifact_file, 'rb') as artifact:
+        assert database.read() == artifact.read()
+
+    # It can be used with the same csv files in another checkout.
+    data_path = tmp_path / 'data'
+    shutil.copytree(TEST_DATA_PATH_DATABASE_LIMITED, data_path)
+    assert verify_catalog_artifact(artifact_file, data_path) is None
+
+    # An artifact built from other csv files is stale.
+    with open(data_path / 'raw_tracks_excerpt.csv', 'a', encoding='utf-8') as tracks_file:
+        tracks_file.write('\n')
+    assert verify_catalog_artifact(artifact_file, data_path) == 'the csv files changed since it was built'
+    assert not install_catalog_artifact(artifact_file, str(tmp_path / 'other.db'), data_path)
+    assert not os.path.exists(tmp_path / 'other.db')
+
+    # So is a modified artifact.
+    with open(artifact_file, 'r+b') as artifact:
+        artifact.seek(-1, os.SEEK_END)
+        artifact.write(b'\x01')
+    assert verify_catalog_artifact(artifact_file, TEST_DATA_PATH_DATABASE_LIMITED) == \
+        'its checksum does not match the manifest'
+
+def test_create_app_copies_the_catalog_artifact(tmp_path, capsys):
+    artifact_file = str(tmp_path / 'catalog.db')
+    app = create_app({
+        'TESTING': True,
+        'REPOSITORY': 'memory',
+        'TEST_DATA_PATH': TEST_DATA_PATH_DATABASE_LIMITED,
+        'CATALOG_CACHE_DIR': None
+    })
+    result = app.test_cli_runner().invoke(args=['build-catalog', '--output', artifact_file])
+    assert result.exit_code == 0, result.output
+    assert os.path.exists(artifact_file) and 'Built' in result.output
+
+    create_app({
+        'TESTING': True,
+        'REPOSITORY': 'database',
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'music.db'}",
+        'TEST_DATA_PATH': TEST_DATA_PATH_DATABASE_LIMITED,
+        'CATALOG_ARTIFACT': artifact_file,
+        'CATALOG_CACHE_DIR': None
+    })
+    assert f'copied {artifact_file}' in capsys.readouterr().out
+    assert repo.repo_instance.get_number_of_tracks() == 2000
+    assert repo.repo_instance.get_track(2).album.title == 'AWOL - A Way Of Life'
+
+    # With CATALOG_BACKGROUND_LOAD the artifact is still copied before the app serves any request, so a user
+    # registering meanwhile is not written to the database file it replaces.
+    create_app({
+        'TESTING': True,
+        'REPOSITORY': 'database',
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'background.db'}",
+        'TEST_DATA_PATH': TEST_DATA_PATH_DATABASE_LIMITED,
+        'CATALOG_ARTIFACT': artifact_file,
+        'CATALOG_CACHE_DIR': None,
+        'CATALOG_BACKGROUND_LOAD': True
+    })
+    assert catalog_warmup.warmup_instance is None
+    assert repo.repo_instance.get_number_of_tracks() == 2000
+
+def test_migrate_database_adds_indexes_to_an_existing_database(tmp_path):
+    database_file = str(tmp_path / 'music.db')
+    engine = create_engine(f'sqlite:///{database_file}')
+    metadata.create_all(engine)
+    engine.dispose()
+    # A database created before the foreign keys were indexed.
+    connection = sqlite3.connect(database_file)
+    index_names = connection.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND name LIKE 'ix_%'")
+    for (index_name,) in index_names.fetchall():
+        connection.execute(f'DROP INDEX {index_name}')
+    # and before it had the track_search index.
+    triggers = connection.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'track_search_%'")
+    for (trigger_name,) in triggers.fetchall():
+        connection.execute(f'DROP TRIGGER {trigger_name}')
+    connection.execute('DROP TABLE track_search')
+    connection.execute("INSERT INTO artists (artist_id, full_name) VALUES (1, 'AWOL')")
+    connection.execute("INSERT INTO tracks (track_id, title, artist_id) VALUES (2, 'Food', 1)")
+    connection.commit()
+    connection.close()
+
+    # Starting the app migrates its database, the command reports that migration. The app maps the existing
+    # database without clearing the mappers of earlier tests.
+    clear_mappers()
+    app = create_app({
+        'TESTING': True,
+        'REPOSITORY': 'database',
+        'TEST_DATA_PATH': TEST_DATA_PATH_DATABASE_LIMITED,
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{database_file}',
+        'CATALOG_CACHE_DIR': None
+    })
+    result = app.test_cli_runner().invoke(args=['migrate-database'])
+    assert result.exit_code == 0, result.output
+    assert f'schema version is now {SCHEMA_VERSION}' in result.output
+    assert 'before: SCAN reviews' in result.output
+    assert 'after:  SEARCH reviews USING INDEX ix_reviews_track_id (track_id=?)' in result.output
+
+    connection = sqlite3.connect(database_file)
+    try:
+        assert connection.execute('PRAGMA user_version').fetchone()[0] == SCHEMA_VERSION
+        indexes = {row[0] for row in connection.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+        assert {'ix_reviews_review_user', 'ix_liked_tracks_user', 'ix_playlists_playlist_user'} <= indexes
+        assert connection.execute("SELECT rowid, title, artist FROM track_search WHERE track_search MATCH 'Foo'") \
+            .fetchall() == [(2, 'Food', 'AWOL')]
+    finally:
+        connection.close()
+
+    result = app.test_cli_runner().invoke(args=['migrate-database', '--no-explain'])
+    assert f'Schema version {SCHEMA_VERSION} is up to date' in result.output
+
+def test_database_engine_applies_the_performance_profile(tmp_path):
+    engine = create_database_engine(f"sqlite:///{tmp_path / 'music.db'}", performance_profile=True,
+                                    mmap_size=1024 * 1024, cache_size=-2048, pool_size=2)
+    assert engine.pool.size() == 2
+    with engine.connect() as connection:
+        assert connection.execute('PRAGMA journal_mode').scalar() == 'wal'
+        # NORMAL
+        assert connection.execute('PRAGMA synchronous').scalar() == 1
+        assert connection.execute('PRAGMA mmap_size').scalar() == 1024 * 1024
+        assert connection.execute('PRAGMA cache_size').scalar() == -2048
+        # MEMORY
+        assert connection.execute('PRAGMA temp_store').scalar() == 2
+    engine.dispose()
+
+    # By default every connection keeps the SQLite defaults.
+    engine = create_database_engine(f"sqlite:///{tmp_path / 'other.db'}")
+    with engine.connect() as connection:
+        assert connection.execute('PRAGMA journal_mode').scalar() == 'delete'
+        assert connection.execute('PRAGMA synchronous').scalar() == 2
+    engine.dispose()
+
+def test_create_app_with_the_performance_profile(tmp_path):
+    app = create_app({
+        'TESTING': True,
+        'REPOSITORY': 'database',
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'music.db'}",
+        'TEST_DATA_PATH': TEST_DATA_PATH_DATABASE_LIMITED,
+        'CATALOG_ARTIFACT': None,
+        'CATALOG_CACHE_DIR': None,
+        'SQLITE_PERFORMANCE_PROFILE': True,
+        'DATABASE_POOL_SIZE': 4
+    })
+    response = app.test_client().get('/track/2')
+    assert response.status_code == 200
+    assert b'Food' in response.data
+
+def test_public_playlists_page_hides_the_add_button_after_subscribing(tmp_path):
+    # Subscriptions are kept in playlist_subscribers, not in the user's own playlists.
+    client = create_app({
+        'TESTING': True,
+        'REPOSITORY': 'database',
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'music.db'}",
+        'TEST_DATA_PATH': TEST_DATA_PATH_DATABASE_LIMITED,
+        'CATALOG_ARTIFACT': None,
+        'CATALOG_CACHE_DIR': None,
+        'WTF_CSRF_ENABLED': False
+    }).test_client()
+    client.post('/authentication/register', data={'user_name': 'noob', 'password': 'Noob1234'})
+    client.post('/authentication/login', data={'user_name': 'noob', 'password': 'Noob1234'})
+    client.post('/user/playlists', data={'playlist': 'hello'})
+    client.post('/user/changevisibility/1')
+    client.get('/authentication/logout')
+
+    client.post('/authentication/register', data={'user_name': 'listener', 'password': 'Listener1234'})
+    client.post('/authentication/login', data={'user_name': 'listener', 'password': 'Listener1234'})
+    assert b'/user/add_public_playlist/1' in client.get('/public_playlists').data
+    assert client.post('/user/add_public_playlist/1').status_code == 302
+    response = client.get('/public_playlists')
+    assert b'1 subscriber' in response.data
+    assert b'/user/add_public_playlist/1' not in response.data